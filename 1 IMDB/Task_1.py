@@ -4,69 +4,139 @@
 # To run on a local cluster:
 # python "1 IMDB\Task_1.py" -r local --no-bootstrap-mrjob "1 IMDB\title.basics.tsv" > "1 IMDB\Task_1.txt"
 
+# To spread the ranking of the words over 4 reducers instead of one, with an extra step which merges their results:
+# python "1 IMDB\Task_1.py" -r local --no-bootstrap-mrjob --salt_partitions=4 "1 IMDB\title.basics.tsv" > "1 IMDB\Task_1.txt"
+
 from mrjob.job import MRJob
 from mrjob.step import MRStep
-import nltk
-from nltk.corpus import stopwords
-import re
-import operator
+from title_keywords import TitleKeywords
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.aggregation import add_in_mapper_combine_args, in_mapper_combiner
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import GROUP, InstrumentedJob, profiling
+from mrtools.salting import KeySizes, add_salting_args, key_salter, unsalt
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from mrtools.topk import top_k
 
 class CustomOutputProtocol:
     # This class will be used to format our output, output needs to be casted to bytes
     def write(self, _, count_word):
         return bytes(f'{count_word[1]}: {count_word[0]}', 'utf-8')
 
-class CommonKeywords(MRJob):
+class CommonKeywords(InstrumentedJob, ParallelJob, MRJob):
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Upload the keyword helpers and the shared mrtools package along with the job
+    FILES = ['title_keywords.py']
+    DIRS = ['../mrtools#mrtools']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(CommonKeywords, self).configure_args()
+        self.add_passthru_arg('--title_cache_size', type=int, default=100000,
+                              help='Amount of titles of which the keywords are cached by each mapper')
+        self.add_passthru_arg('--tag_batch_size', type=int, default=1000,
+                              help='Amount of uncached titles which are POS tagged at once')
+        add_text_tables_arg(self)
+        add_in_mapper_combine_args(self)
+        self.add_passthru_arg('--top_k', type=int, default=50,
+                              help='Amount of most common keywords to output')
+        add_salting_args(self)
+
     def init_mapper(self):
-        # We'll generate a list with words to avoid: common stopwords in the most common languages
-        self.stop_words = [re.sub("'", "\'", word) for language in ('english', 'spanish', 'french', 'german', 'italian')
-                           for word in stopwords.words(language)]
-        # We'll also ignore the word 'untitled'
-        self.stop_words.append('untitled')
-        # VBZ = auxiliary verbs, IN = preposition, DT = articles/determinants, CC = conjunction, CNJ = conjunction,
-        # PRO = pronoun, POS = possessive ending ('s), P = preposition, the others are the respective symbols.
-        self.non_useful_types = ('VBZ', 'IN', 'DT', 'CC', 'CNJ', 'PRO', 'P', 'POS', ',', ':', '.', '\'')
+        # Stopwords, POS tagging and the cache of already processed titles are handled by TitleKeywords
+        self.titles = TitleKeywords(self.options.title_cache_size, self.options.tag_batch_size,
+                                    text_tables(self.options))
+        # Sums the counts in the mapper when --in_mapper_combine is given, otherwise passes them on right away
+        self.counts = in_mapper_combiner(self.options)
 
     def mapper_get_words(self, _, line):
         line = list(line.split())
         if line[1] in ('movie', 'short'):  # titleType is on position 1
-            primary_title = nltk.tokenize.word_tokenize(line[2])  # PrimaryTitle is on position 2
-            for word, type in nltk.pos_tag(primary_title):
-                word = word.lower()
-                # Check whether type and word are meaningful
-                if (type not in self.non_useful_types) and (word not in self.stop_words) and word.isalpha():
-                    yield word, 1
+            # PrimaryTitle is on position 2, the keywords might only be known once a batch of titles has been tagged
+            yield from self.emit_words(self.titles.add(line[2], None))
+
+    def emit_words(self, item_keywords):
+        for _, keywords in item_keywords:
+            for word in keywords:
+                yield from self.counts.add(word, 1)
+
+    def final_mapper(self):
+        # Process the titles which are still waiting to be tagged
+        yield from self.emit_words(self.titles.flush())
+        # Report how well the cache performs, this allows tuning --title_cache_size
+        self.increment_counter('title cache', 'hits', self.titles.cache.hits)
+        self.increment_counter('title cache', 'misses', self.titles.cache.misses)
+        self.increment_counter('title cache', 'tagged titles', self.titles.tagged)
+        if profiling():
+            self.increment_counter(GROUP, 'mapper nltk tagging ms', round(self.titles.tag_seconds * 1000))
+        # Pass on the counts which were summed in the mapper
+        yield from self.counts.flush()
 
     @staticmethod
     def sum_values(word, count):
         # return word as key, sum of counts as value
         yield word, sum(count)
 
+    def init_reducer(self):
+        # Counts the words which go to the key of the next step, these are all ranked by one reducer without salting
+        self.key_sizes = KeySizes()
+
+    def reducer_sum_values(self, word, count):
+        self.key_sizes.add(None)
+        yield word, sum(count)
+
+    def final_reducer(self):
+        self.key_sizes.report(self)
+
     @staticmethod
     def mapper_None_count_word(word, count):
         # For each key word yield no key and (count, word) as value
         yield None, (count, word)
 
-    @staticmethod
-    def fifty_max_values(_, count_words):
+    def init_salting(self):
+        self.salter = key_salter(self.options)
+
+    def mapper_salted_count_word(self, word, count):
+        # The same as mapper_None_count_word, but the words are spread over --salt_partitions keys
+        yield self.salter.salt(None, word), (count, word)
+
+    def fifty_max_values(self, key, count_words):
         """
         Mrjob sorts the pairs based on 'word', no matter the order in which count_words or word_counts is defined.
-        So we need to sort them ourselves based on count and then select the 50 highest
+        So we need to select the 50 (--top_k) highest counts ourselves, this is done with a heap which never holds more
+        than 50 (count, word) pairs. Words with the same count are ordered alphabetically.
         """
-        count_words = list(count_words)
-        for count_word in sorted(count_words, key=operator.itemgetter(0), reverse=True)[:50]:
-            yield None, count_word
+        for count_word in top_k(count_words, self.options.top_k):
+            yield key, count_word
 
     def steps(self):
+        count_words = MRStep(mapper_init=self.init_mapper,
+                             mapper=self.mapper_get_words,
+                             mapper_final=self.final_mapper,
+                             # The combiner is not needed when the mapper already sums the counts itself
+                             combiner=None if self.options.in_mapper_combine else self.sum_values,
+                             reducer_init=self.init_reducer,
+                             reducer=self.reducer_sum_values,
+                             reducer_final=self.final_reducer)
+        if self.options.salt_partitions <= 1:
+            return [
+                count_words,
+                MRStep(mapper=self.mapper_None_count_word,
+                       combiner=self.fifty_max_values,
+                       reducer=self.fifty_max_values)
+            ]
         return [
-            MRStep(mapper_init=self.init_mapper,
-                   mapper=self.mapper_get_words,
-                   combiner=self.sum_values,
-                   reducer=self.sum_values),
-            MRStep(mapper=self.mapper_None_count_word,
+            count_words,
+            # Every reducer selects the 50 most common words of its part of the words
+            MRStep(mapper_init=self.init_salting,
+                   mapper=self.mapper_salted_count_word,
                    combiner=self.fifty_max_values,
+                   reducer=self.fifty_max_values),
+            # Which are merged into the 50 most common words of all
+            MRStep(mapper=unsalt,
                    reducer=self.fifty_max_values)
         ]
 
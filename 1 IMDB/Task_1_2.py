@@ -0,0 +1,143 @@
+# Calculates the results of both Task_1.py and Task_2.py while reading and tagging the titles only once.
+
+# To run inline:
+# python "1 IMDB\Task_1_2.py" --task_1_output="1 IMDB\Task_1.txt" --task_2_output="1 IMDB\Task_2.txt" "1 IMDB\title.basics.tsv"
+
+# To run on a local cluster:
+# python "1 IMDB\Task_1_2.py" -r local --no-bootstrap-mrjob --task_1_output="1 IMDB\Task_1.txt" --task_2_output="1 IMDB\Task_2.txt" "1 IMDB\title.basics.tsv"
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.util import to_lines
+from title_keywords import TitleKeywords
+import codecs
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.aggregation import add_in_mapper_combine_args, in_mapper_combiner
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import GROUP, InstrumentedJob, profiling
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from mrtools.topk import top_k
+
+class CustomOutputProtocol:
+    # This class will be used to format our output, output needs to be casted to bytes
+    def write(self, genre, count_word):
+        if genre is None:  # The overall ranking, formatted like Task_1.py
+            return bytes(f'{count_word[1]}: {count_word[0]}', 'utf-8')
+        return bytes(f'{genre}: {count_word[1]}, {count_word[0]}', 'utf-8')  # A ranking per genre, like Task_2.py
+
+class CommonAndTopKeywords(InstrumentedJob, ParallelJob, MRJob):
+    # Set the output protocol to our own, custom protocol
+    OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Upload the keyword helpers and the shared mrtools package along with the job
+    FILES = ['title_keywords.py']
+    DIRS = ['../mrtools#mrtools']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(CommonAndTopKeywords, self).configure_args()
+        self.add_passthru_arg('--title_cache_size', type=int, default=100000,
+                              help='Amount of titles of which the keywords are cached by each mapper')
+        self.add_passthru_arg('--tag_batch_size', type=int, default=1000,
+                              help='Amount of uncached titles which are POS tagged at once')
+        add_text_tables_arg(self)
+        add_in_mapper_combine_args(self)
+        self.add_passthru_arg('--top_k', type=int, default=50,
+                              help='Amount of most common keywords to output (Task 1)')
+        self.add_passthru_arg('--top_k_per_genre', type=int, default=15,
+                              help='Amount of most common keywords to output per genre (Task 2)')
+        # These are only used when launching the job, so they don't have to be passed to the mappers and reducers
+        self.arg_parser.add_argument('--task_1_output', help='File to write the overall keyword ranking to')
+        self.arg_parser.add_argument('--task_2_output', help='File to write the keyword rankings per genre to')
+
+    def init_mapper(self):
+        # Stopwords, POS tagging and the cache of already processed titles are handled by TitleKeywords
+        self.titles = TitleKeywords(self.options.title_cache_size, self.options.tag_batch_size,
+                                    text_tables(self.options))
+        # Sums the counts in the mapper when --in_mapper_combine is given, otherwise passes them on right away
+        self.counts = in_mapper_combiner(self.options)
+
+    def mapper_get_words(self, _, line):
+        line = list(line.split())
+        if line[1] in ('movie', 'short'):  # titleType is on position 1
+            genres = line[-1].split(',')  # Genres are on the last position
+            # PrimaryTitle is on position 2, the keywords might only be known once a batch of titles has been tagged
+            yield from self.emit_words(self.titles.add(line[2], (line[1], genres)))
+
+    def emit_words(self, type_genres_keywords):
+        """
+        Every keyword is counted once with None as genre for the overall ranking (movies and shorts) and, for movies,
+        once for each of its genres for the rankings per genre.
+        """
+        for (title_type, genres), keywords in type_genres_keywords:
+            for word in keywords:
+                yield from self.counts.add((None, word), 1)
+                if title_type == 'movie':
+                    for genre in genres:        # A movie sometimes has multiple genres
+                        if genre != '\\N':      # We don't want to include movies which don't have a genre specified
+                            yield from self.counts.add((genre, word), 1)
+
+    def final_mapper(self):
+        # Process the titles which are still waiting to be tagged
+        yield from self.emit_words(self.titles.flush())
+        # Report how well the cache performs, this allows tuning --title_cache_size
+        self.increment_counter('title cache', 'hits', self.titles.cache.hits)
+        self.increment_counter('title cache', 'misses', self.titles.cache.misses)
+        self.increment_counter('title cache', 'tagged titles', self.titles.tagged)
+        if profiling():
+            self.increment_counter(GROUP, 'mapper nltk tagging ms', round(self.titles.tag_seconds * 1000))
+        # Pass on the counts which were summed in the mapper
+        yield from self.counts.flush()
+
+    @staticmethod
+    def sum_values(genre_word, count):
+        # sum the counts
+        yield genre_word, sum(count)
+
+    @staticmethod
+    def mapper_to_genres(genre_word, count):
+        # yield genre (None for the overall ranking), (count, word)
+        yield genre_word[0], (count, genre_word[1])
+
+    def max_values(self, genre, count_words):
+        # Select the --top_k highest counts overall and the --top_k_per_genre highest counts for each genre
+        k = self.options.top_k if genre is None else self.options.top_k_per_genre
+        for count_word in top_k(count_words, k):
+            yield genre, count_word
+
+    def run_job(self):
+        """
+        When --task_1_output and --task_2_output are given the overall ranking and the rankings per genre are written to
+        these two files, otherwise both are written to stdout.
+        """
+        if bool(self.options.task_1_output) != bool(self.options.task_2_output):
+            self.arg_parser.error('--task_1_output and --task_2_output have to be given together')
+        if not self.options.task_1_output:
+            return super(CommonAndTopKeywords, self).run_job()
+        self.set_up_logging(quiet=self.options.quiet, verbose=self.options.verbose,
+                            stream=codecs.getwriter('utf_8')(self.stderr))
+        with self.make_runner() as runner:
+            runner.run()
+            with open(self.options.task_1_output, 'wb') as task_1_file, \
+                    open(self.options.task_2_output, 'wb') as task_2_file:
+                for line in to_lines(runner.cat_output()):
+                    # Keywords only consist of letters, so only the lines of a genre ranking contain ', '
+                    (task_2_file if b', ' in line else task_1_file).write(line)
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.init_mapper,
+                   mapper=self.mapper_get_words,
+                   mapper_final=self.final_mapper,
+                   # The combiner is not needed when the mapper already sums the counts itself
+                   combiner=None if self.options.in_mapper_combine else self.sum_values,
+                   reducer=self.sum_values),
+            MRStep(mapper=self.mapper_to_genres,
+                   combiner=self.max_values,
+                   reducer=self.max_values)
+        ]
+
+
+if __name__ == '__main__':
+    CommonAndTopKeywords.run()
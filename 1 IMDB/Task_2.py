@@ -4,73 +4,147 @@
 # To run on a local cluster:
 # python "1 IMDB\Task_2.py" -r local --no-bootstrap-mrjob "1 IMDB\title.basics.tsv" > "1 IMDB\Task_2.txt"
 
+# Drama has far more keywords than the other genres (see the 'key sizes of the next step' counters), to spread it over
+# 4 reducers with an extra step which merges their results:
+# python "1 IMDB\Task_2.py" -r local --no-bootstrap-mrjob --salt_partitions=4 --hot_keys=Drama "1 IMDB\title.basics.tsv" > "1 IMDB\Task_2.txt"
+
+# To see where the time goes: a summary of the records, bytes and time per phase of every step and a cProfile dump of
+# the slowest mapper are written to the profile directory (this works for all jobs)
+# python "1 IMDB\Task_2.py" --profile="1 IMDB\profile" --cprofile "1 IMDB\title.basics.tsv" > "1 IMDB\Task_2.txt"
+
 from mrjob.job import MRJob
 from mrjob.step import MRStep
-import nltk
-from nltk.corpus import stopwords
-import operator
-import re
+from title_keywords import TitleKeywords
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.aggregation import add_in_mapper_combine_args, in_mapper_combiner
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import GROUP, InstrumentedJob, profiling
+from mrtools.salting import KeySizes, add_salting_args, key_salter, unsalt
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from mrtools.topk import top_k
 
 class CustomOutputProtocol:
     # This class will be used to format our output, output needs to be casted to bytes
     def write(self, key, value):
         return bytes(f'{key}: {value[1]}, {value[0]}', 'utf-8')
 
-class TopKeywords(MRJob):
+class TopKeywords(InstrumentedJob, ParallelJob, MRJob):
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Upload the keyword helpers and the shared mrtools package along with the job
+    FILES = ['title_keywords.py']
+    DIRS = ['../mrtools#mrtools']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(TopKeywords, self).configure_args()
+        self.add_passthru_arg('--title_cache_size', type=int, default=100000,
+                              help='Amount of titles of which the keywords are cached by each mapper')
+        self.add_passthru_arg('--tag_batch_size', type=int, default=1000,
+                              help='Amount of uncached titles which are POS tagged at once')
+        add_text_tables_arg(self)
+        add_in_mapper_combine_args(self)
+        self.add_passthru_arg('--top_k', type=int, default=15,
+                              help='Amount of most common keywords to output per genre')
+        add_salting_args(self)
 
     def init_mapper(self):
-        # We'll generate a list with words to avoid: common stopwords in the most common languages
-        self.stop_words = [re.sub("'", "\'", word) for language in ('english', 'spanish', 'french', 'german', 'italian')
-                           for word in stopwords.words(language)]
-        # We'll also ignore the word 'untitled'
-        self.stop_words.append('untitled')
-        # VBZ = auxiliary verbs, IN = preposition, DT = articles/determinants, CC = conjunction, CNJ = conjunction,
-        # PRO = pronoun, POS = possessive ending ('s), P = preposition, the others are the respective symbols.
-        self.non_useful_types = ('VBZ', 'IN', 'DT', 'CC', 'CNJ', 'PRO', 'P', 'POS', ',', ':', '.', '\'')
+        # Stopwords, POS tagging and the cache of already processed titles are handled by TitleKeywords
+        self.titles = TitleKeywords(self.options.title_cache_size, self.options.tag_batch_size,
+                                    text_tables(self.options))
+        # Sums the counts in the mapper when --in_mapper_combine is given, otherwise passes them on right away
+        self.counts = in_mapper_combiner(self.options)
 
     def mapper_get_genre_words(self, _, line):
         line = list(line.split())
         if line[1] == 'movie':           # titleType is on position 1, only select those which are movies
-            primary_title = nltk.pos_tag(nltk.tokenize.word_tokenize(line[2]))  # PrimaryTitle is on position 2
             genres = line[-1].split(',')  # Genres are on the last position
+            # PrimaryTitle is on position 2, the keywords might only be known once a batch of titles has been tagged
+            yield from self.emit_genre_words(self.titles.add(line[2], genres))
+
+    def emit_genre_words(self, genres_keywords):
+        for genres, keywords in genres_keywords:
             for genre in genres:        # A movie sometimes has multiple genres
                 if genre != '\\N':      # We don't want to include movies which don't have a genre specified
-                    for word, type in primary_title:
-                        word = word.lower()
-                        # Check whether type and word are meaningful
-                        if (type not in self.non_useful_types) and (word not in self.stop_words) and word.isalpha():
-                            yield (genre, word), 1
+                    for word in keywords:
+                        yield from self.counts.add((genre, word), 1)
+
+    def final_mapper(self):
+        # Process the titles which are still waiting to be tagged
+        yield from self.emit_genre_words(self.titles.flush())
+        # Report how well the cache performs, this allows tuning --title_cache_size
+        self.increment_counter('title cache', 'hits', self.titles.cache.hits)
+        self.increment_counter('title cache', 'misses', self.titles.cache.misses)
+        self.increment_counter('title cache', 'tagged titles', self.titles.tagged)
+        if profiling():
+            self.increment_counter(GROUP, 'mapper nltk tagging ms', round(self.titles.tag_seconds * 1000))
+        # Pass on the counts which were summed in the mapper
+        yield from self.counts.flush()
 
     @staticmethod
     def sum_values(genre_word, count):
         # sum the counts
         yield genre_word, sum(count)
 
+    def init_reducer(self):
+        # Counts the keywords of every genre, which are all ranked by the same reducer without salting
+        self.key_sizes = KeySizes()
+
+    def reducer_sum_values(self, genre_word, count):
+        self.key_sizes.add(genre_word[0])
+        yield genre_word, sum(count)
+
+    def final_reducer(self):
+        self.key_sizes.report(self)
+
     @staticmethod
     def mapper_to_genres(genre_words, count):
         # yield genre, (count, word)
         yield genre_words[0], (count, genre_words[1])
 
-    @staticmethod
-    def fifteen_per_genre(genre, count_words):
+    def init_salting(self):
+        self.salter = key_salter(self.options)
+
+    def mapper_to_salted_genres(self, genre_words, count):
+        # The same as mapper_to_genres, but the words of the --hot_keys genres are spread over --salt_partitions keys
+        yield self.salter.salt(genre_words[0], genre_words[1]), (count, genre_words[1])
+
+    def fifteen_per_genre(self, genre, count_words):
         """
         Mrjob sorts the pairs based on 'word', no matter the order in which count_words or word_counts is defined.
-        So we need to sort them ourselves based on count and then select the 15 highest for each genre
+        So we need to select the 15 (--top_k) highest counts for each genre ourselves, this is done with a heap which
+        never holds more than 15 (count, word) pairs. Words with the same count are ordered alphabetically.
         """
-        count_words = list(count_words)
-        for count_words in sorted(count_words, key=operator.itemgetter(0), reverse=True)[:15]:
-            yield genre, count_words
+        for count_word in top_k(count_words, self.options.top_k):
+            yield genre, count_word
 
     def steps(self):
+        count_genre_words = MRStep(mapper_init=self.init_mapper,
+                                   mapper=self.mapper_get_genre_words,
+                                   mapper_final=self.final_mapper,
+                                   # The combiner is not needed when the mapper already sums the counts itself
+                                   combiner=None if self.options.in_mapper_combine else self.sum_values,
+                                   reducer_init=self.init_reducer,
+                                   reducer=self.reducer_sum_values,
+                                   reducer_final=self.final_reducer)
+        if self.options.salt_partitions <= 1:
+            return [
+                count_genre_words,
+                MRStep(mapper=self.mapper_to_genres,
+                       combiner=self.fifteen_per_genre,
+                       reducer=self.fifteen_per_genre)
+            ]
         return [
-            MRStep(mapper_init=self.init_mapper,
-                   mapper=self.mapper_get_genre_words,
-                   combiner=self.sum_values,
-                   reducer=self.sum_values),
-            MRStep(mapper=self.mapper_to_genres,
+            count_genre_words,
+            # Every reducer selects the 15 most common words of its part of a genre
+            MRStep(mapper_init=self.init_salting,
+                   mapper=self.mapper_to_salted_genres,
                    combiner=self.fifteen_per_genre,
+                   reducer=self.fifteen_per_genre),
+            # Which are merged into the 15 most common words of the genre
+            MRStep(mapper=unsalt,
                    reducer=self.fifteen_per_genre)
         ]
 
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.cache import LRUCache
+from mrtools.text_tables import NON_USEFUL_TYPES, title_stop_words
+
+
+class TitleKeywords:
+    """
+    Turns titles into their keywords: the lowercase words which are not a stopword and don't have a non-useful type.
+    Many titles occur over and over again (e.g. episode names), so the keywords of the most recently used titles are
+    kept in a cache. Titles which are not in the cache are collected and tagged in batches (of at most batch_size
+    titles) with nltk.pos_tag_sents, which is a lot faster than tagging them one by one.
+
+    Every title is passed along with an item (e.g. its genres), add and flush yield (item, keywords) pairs as soon as
+    the keywords of the title are known.
+
+    The stop words and types come from the tables of mrtools/text_tables.py when these are given, nltk is then only
+    imported once titles have to be tagged.
+    """
+    def __init__(self, cache_size, batch_size, tables=None):
+        if tables is None:
+            self.stop_words, self.non_useful_types = title_stop_words(), NON_USEFUL_TYPES
+        else:
+            self.stop_words, self.non_useful_types = tables['title_stop_words'], tables['non_useful_types']
+        self.cache = LRUCache(cache_size)
+        self.batch_size = batch_size
+        self.pending = {}  # title -> list of items which are waiting for the keywords of this title
+        self.pending_items = 0
+        self.tagged = 0  # Amount of titles which had to be tagged
+        self.tag_seconds = 0.0  # Time spent by nltk on tokenizing and tagging them
+
+    def keywords(self, tagged_title):
+        keywords = []
+        for word, type in tagged_title:
+            word = word.lower()
+            # Check whether type and word are meaningful
+            if (type not in self.non_useful_types) and (word not in self.stop_words) and word.isalpha():
+                keywords.append(word)
+        return keywords
+
+    def add(self, title, item):
+        keywords = self.cache.get(title)
+        if keywords is not None:
+            yield item, keywords
+        else:
+            self.pending.setdefault(title, []).append(item)
+            self.pending_items += 1
+            # Count the items rather than the titles, so the memory used is bounded even when a title keeps recurring
+            if self.pending_items >= self.batch_size:
+                yield from self.flush()
+
+    def flush(self):
+        # Tag all pending titles at once
+        if not self.pending:
+            return
+        start = time.perf_counter()
+        import nltk
+        titles = list(self.pending)
+        self.tagged += len(titles)
+        tagged_titles = nltk.pos_tag_sents([nltk.tokenize.word_tokenize(title) for title in titles])
+        self.tag_seconds += time.perf_counter() - start
+        for title, tagged_title in zip(titles, tagged_titles):
+            keywords = self.keywords(tagged_title)
+            self.cache.put(title, keywords)
+            for item in self.pending[title]:
+                yield item, keywords
+        self.pending = {}
+        self.pending_items = 0
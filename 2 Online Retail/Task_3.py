@@ -1,38 +1,83 @@
 # To run inline:
 # python "2 Online Retail\Task_3.py" "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_3.txt"
 
+# To read the files in chunks with pandas (this also works on a local cluster):
+# python "2 Online Retail\Task_3.py" --chunked "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_3.txt"
+
 # To run on a local cluster:
 # python "2 Online Retail\Task_3.py" -r local --no-bootstrap-mrjob "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_3.txt"
 
 from mrjob.job import MRJob
 from mrjob.step import MRStep
-import datetime
-import operator
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.aggregation import add_in_mapper_combine_args, in_mapper_combiner
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.protocols import PackedProtocol
+from mrtools.topk import top_k
+from retail_ingest import CUSTOMER, INVOICE_DATE, PRICE, QUANTITY, parse_line, year_of, read_chunks, \
+    revenue_per_year_customer
 
 class CustomOutputProtocol:
     # This class will be used to format our output, output needs to be casted to bytes
     def write(self, key, value):
         return bytes(f'Customer {value[1]} spent \u20ac{round(value[0], 2)} in {key}', 'utf-8')
 
-class YearlyTopCustomers(MRJob):
+class YearlyTopCustomers(InstrumentedJob, ParallelJob, MRJob):
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Pass the data between the steps in a compact binary format instead of JSON text
+    INTERNAL_PROTOCOL = PackedProtocol
+    # The mrtools package has to be uploaded along with the job when the tasks run in their own directory
+    DIRS = ['../mrtools#mrtools']
+    FILES = ['retail_ingest.py']
 
-    @staticmethod
-    def mapper_year_customer_with_revenue(_, line):
-        line = line.split(',')
-        if line[0] != 'Invoice':  # This ensures that the file header is not included
-            """
-            The csv (comma-separated value) file has a field (description) which can contain commas...
-            This field is thus split into two fields by the split method called above.
-            Indexing has therefore been done from the back to avoid ValueErrors when selecting the price/amount/date
-            """
-            customer, quantity, price = line[-2], float(line[-5]), float(line[-3])
-            year = datetime.datetime.strptime(line[-4], '%m/%d/%Y %H:%M:%S').year
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(YearlyTopCustomers, self).configure_args()
+        add_in_mapper_combine_args(self)
+        self.add_passthru_arg('--chunked', action='store_true',
+                              help='Read each file in chunks with pandas and sum the revenues per chunk')
+        self.add_passthru_arg('--chunk_size', type=int, default=100000,
+                              help='Amount of lines per chunk when using --chunked')
+        self.add_passthru_arg('--top_k', type=int, default=10,
+                              help='Amount of customers with the highest revenue to output per year')
+        # Used by incremental.py, which keeps the partial sums of earlier runs and only needs those of the new files
+        self.add_passthru_arg('--partials_only', action='store_true',
+                              help='Only run the first step and output its sums with the internal protocol')
+
+    def output_protocol(self):
+        # The partial sums are read back in by incremental.py, so they are written in the internal format
+        if self.options.partials_only:
+            return self.internal_protocol()
+        return super(YearlyTopCustomers, self).output_protocol()
+
+    def init_mapper(self):
+        # Sums the revenues in the mapper when --in_mapper_combine is given, otherwise passes them on right away
+        self.revenues = in_mapper_combiner(self.options)
+
+    def mapper_year_customer_with_revenue(self, _, line):
+        line = parse_line(line)
+        if line:  # parse_line returns None for the file header
+            # The description field can contain commas, but it is quoted so the csv module parses it correctly
+            customer, quantity, price = line[CUSTOMER], float(line[QUANTITY]), float(line[PRICE])
+            year = year_of(line[INVOICE_DATE])
 
             # Get rid of customer fields which are blank as these will all be added to one customer: ""
             if customer:
-                yield (year, customer), quantity*price
+                yield from self.revenues.add((year, customer), quantity*price)
+
+    def mapper_raw_year_customer_with_revenue(self, path, uri):
+        # Read the whole file in chunks with pandas, the revenues are already summed within each chunk
+        for chunk in read_chunks(path, self.options.chunk_size):
+            for year_customer, revenue in revenue_per_year_customer(chunk):
+                yield from self.revenues.add(year_customer, revenue)
+
+    def final_mapper(self):
+        # Pass on the revenues which were summed in the mapper
+        yield from self.revenues.flush()
 
     @staticmethod
     def sum_value(year_customer, revenue):
@@ -44,25 +89,31 @@ class YearlyTopCustomers(MRJob):
         # yield year, (revenue, customer)
         yield year_customer[0], (float(yearly_revenue), year_customer[1])
 
-    @staticmethod
-    def max_10_per_year(year, revenue_customers):
+    def max_10_per_year(self, year, revenue_customers):
         """
         Mrjob sorts the pairs based on 'customer', no matter the order in which revenue_customers or customer_revenues
-        is defined. So we need to sort them ourselves based on revenue and then select the 10 highest for each year
+        is defined. So we need to select the 10 (--top_k) highest revenues for each year ourselves, this is done with a
+        heap which never holds more than 10 (revenue, customer) pairs. Customers with the same revenue are ordered on
+        their id.
         """
-        revenue_customers = list(revenue_customers)
-        for revenue_customer in sorted(revenue_customers, key=operator.itemgetter(0), reverse=True)[:10]:
+        for revenue_customer in top_k(revenue_customers, self.options.top_k):
             yield year, revenue_customer
 
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper_year_customer_with_revenue,
-                   combiner=self.sum_value,
+        steps = [
+            MRStep(mapper_init=self.init_mapper,
+                   mapper=None if self.options.chunked else self.mapper_year_customer_with_revenue,
+                   mapper_raw=self.mapper_raw_year_customer_with_revenue if self.options.chunked else None,
+                   mapper_final=self.final_mapper,
+                   # The combiner is not needed when the mapper already sums the revenues itself
+                   combiner=None if self.options.in_mapper_combine else self.sum_value,
                    reducer=self.sum_value),
             MRStep(mapper=self.mapper_to_years,
                    combiner=self.max_10_per_year,
                    reducer=self.max_10_per_year)
         ]
+        # Only the partial sums of the first step are needed when updating the state of incremental.py
+        return steps[:1] if self.options.partials_only else steps
 
 
 if __name__ == '__main__':
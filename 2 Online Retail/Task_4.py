@@ -1,11 +1,25 @@
 # To run inline:
 # python "2 Online Retail\Task_4.py" "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_4.txt"
 
+# To read the files in chunks with pandas (this also works on a local cluster):
+# python "2 Online Retail\Task_4.py" --chunked "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_4.txt"
+
 # To run on a local cluster:
 # python "2 Online Retail\Task_4.py" -r local --no-bootstrap-mrjob "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_4.txt"
 
+# To spread the search for the maxima over 4 reducers instead of one, with an extra step which merges their results:
+# python "2 Online Retail\Task_4.py" -r local --no-bootstrap-mrjob --salt_partitions=4 "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_4.txt"
+
 from mrjob.job import MRJob
 from mrjob.step import MRStep
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.protocols import PackedProtocol
+from mrtools.salting import KeySizes, add_salting_args, key_salter, unsalt
+from retail_ingest import PRICE, QUANTITY, STOCKCODE, parse_line, read_chunks, quantity_revenue_per_stockcode
 import operator
 
 class CustomOutputProtocol:
@@ -19,25 +33,48 @@ class CustomOutputProtocol:
             return bytes(f"Item '{value[2]}' was sold the most: {int(value[0])} times. ", 'utf-8')
         return bytes(f"Item '{value[2]}' had the highest revenue: \u20ac{round(value[1], 2)}.", 'utf-8')
 
-class MostPopularItems(MRJob):
+class MostPopularItems(InstrumentedJob, ParallelJob, MRJob):
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Pass the data between the steps in a compact binary format instead of JSON text
+    INTERNAL_PROTOCOL = PackedProtocol
+    # The mrtools package has to be uploaded along with the job when the tasks run in their own directory
+    DIRS = ['../mrtools#mrtools']
+    FILES = ['retail_ingest.py']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(MostPopularItems, self).configure_args()
+        self.add_passthru_arg('--chunked', action='store_true',
+                              help='Read each file in chunks with pandas and sum the quantities and revenues per chunk')
+        self.add_passthru_arg('--chunk_size', type=int, default=100000,
+                              help='Amount of lines per chunk when using --chunked')
+        # Used by incremental.py, which keeps the partial sums of earlier runs and only needs those of the new files
+        self.add_passthru_arg('--partials_only', action='store_true',
+                              help='Only run the first step and output its sums with the internal protocol')
+        add_salting_args(self)
+
+    def output_protocol(self):
+        # The partial sums are read back in by incremental.py, so they are written in the internal format
+        if self.options.partials_only:
+            return self.internal_protocol()
+        return super(MostPopularItems, self).output_protocol()
 
     @staticmethod
     def mapper_code_with_quantity_revenue(_, line):
-        line = line.split(',')
-        if line[0] != 'Invoice':  # This ensures that the file header is not included
-            """
-            The csv (comma-separated value) file has a field (description) which can contain commas.
-            This field is thus split into two fields by the split method called above.
-            Indexing has therefore been done from the back where necessary to avoid erroneous values
-            e.g., selecting the price and quantity
-            """
-            stockcode, quantity, price = line[1], float(line[-5]), float(line[-3])
+        line = parse_line(line)
+        if line:  # parse_line returns None for the file header
+            # The description field can contain commas, but it is quoted so the csv module parses it correctly
+            stockcode, quantity, price = line[STOCKCODE], float(line[QUANTITY]), float(line[PRICE])
 
             if stockcode:  # Don't include empty stockcodes as these will all be added to one item: ""
                 yield stockcode, (quantity, quantity*price)
 
+    def mapper_raw_code_with_quantity_revenue(self, path, uri):
+        # Read the whole file in chunks with pandas, the quantities and revenues are already summed within each chunk
+        for chunk in read_chunks(path, self.options.chunk_size):
+            yield from quantity_revenue_per_stockcode(chunk)
+
     @staticmethod
     def sum_quantity_sum_revenue(stockcode, quantity_revenue):
         # yield same stockcode as key, and the tuple of the sums of the quantities and revenues as value
@@ -46,33 +83,64 @@ class MostPopularItems(MRJob):
         revenue = sum([row[1] for row in quantity_revenue_list])  # Sum the revenues of each stockcode
         yield stockcode, (quantity, revenue)
 
+    def init_reducer(self):
+        # Counts the stockcodes which go to the key of the next step, these all go to one reducer without salting
+        self.key_sizes = KeySizes()
+
+    def reducer_sum_quantity_sum_revenue(self, stockcode, quantity_revenue):
+        self.key_sizes.add(None)
+        yield from self.sum_quantity_sum_revenue(stockcode, quantity_revenue)
+
+    def final_reducer(self):
+        self.key_sizes.report(self)
 
     @staticmethod
     def mapper_to_None(stockcode, quantity_revenue):
         # yield None, (quantity, revenue, stockcode)
         yield None, (quantity_revenue[0], quantity_revenue[1], stockcode)
 
+    def init_salting(self):
+        self.salter = key_salter(self.options)
+
+    def mapper_to_salted_None(self, stockcode, quantity_revenue):
+        # The same as mapper_to_None, but the stockcodes are spread over --salt_partitions keys
+        yield self.salter.salt(None, stockcode), (quantity_revenue[0], quantity_revenue[1], stockcode)
+
     @staticmethod
-    def max_per_quantity_and_revenue(_, quantity_revenue_code):
+    def max_per_quantity_and_revenue(key, quantity_revenue_code):
         """
-        Yield None as key, as value once the tuple (quantity, revenue, stockcode) for the item with the highest quantity
-        and once for the item with the highest price
+        Yield the same key (None, unless salted), as value once the tuple (quantity, revenue, stockcode) for the item
+        with the highest quantity and once for the item with the highest price
         """
         quantity_revenue_code_list = list(quantity_revenue_code)
         # Get the (quantity, revenue, stockcode) for the item with the highest quantity
-        yield None, max(quantity_revenue_code_list, key=operator.itemgetter(0))
+        yield key, max(quantity_revenue_code_list, key=operator.itemgetter(0))
         # Get the (quantity, revenue, stockcode) for the item with the highest revenue
-        yield None, max(quantity_revenue_code_list, key=operator.itemgetter(1))
+        yield key, max(quantity_revenue_code_list, key=operator.itemgetter(1))
 
     def steps(self):
-        return [
-            MRStep(mapper=self.mapper_code_with_quantity_revenue,
+        steps = [
+            MRStep(mapper=None if self.options.chunked else self.mapper_code_with_quantity_revenue,
+                   mapper_raw=self.mapper_raw_code_with_quantity_revenue if self.options.chunked else None,
                    combiner=self.sum_quantity_sum_revenue,
-                   reducer=self.sum_quantity_sum_revenue),
-            MRStep(mapper=self.mapper_to_None,
-                   combiner=self.max_per_quantity_and_revenue,
-                   reducer=self.max_per_quantity_and_revenue)
+                   reducer_init=self.init_reducer,
+                   reducer=self.reducer_sum_quantity_sum_revenue,
+                   reducer_final=self.final_reducer)
         ]
+        if self.options.salt_partitions <= 1:
+            steps.append(MRStep(mapper=self.mapper_to_None,
+                                combiner=self.max_per_quantity_and_revenue,
+                                reducer=self.max_per_quantity_and_revenue))
+        else:
+            # Every reducer finds the maxima of its part of the stockcodes, which are merged into the overall maxima
+            steps.append(MRStep(mapper_init=self.init_salting,
+                                mapper=self.mapper_to_salted_None,
+                                combiner=self.max_per_quantity_and_revenue,
+                                reducer=self.max_per_quantity_and_revenue))
+            steps.append(MRStep(mapper=unsalt,
+                                reducer=self.max_per_quantity_and_revenue))
+        # Only the partial sums of the first step are needed when updating the state of incremental.py
+        return steps[:1] if self.options.partials_only else steps
 
 
 if __name__ == '__main__':
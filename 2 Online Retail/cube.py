@@ -0,0 +1,106 @@
+# Builds a cube of the revenue per (day, customer) and the quantity and revenue per (day, stockcode), which is saved as
+# numpy arrays. query_cube.py answers the questions of Task_3.py and Task_4.py, or the same questions for any month,
+# quarter or date range, from this cube without another pass over the csv files.
+
+# To run inline:
+# python "2 Online Retail\cube.py" --cube="2 Online Retail\retail_cube.npz" "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv"
+
+# To run on a local cluster:
+# python "2 Online Retail\cube.py" -r local --no-bootstrap-mrjob --cube="2 Online Retail\retail_cube.npz" "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv"
+
+from mrjob.job import MRJob
+from mrjob.protocol import JSONProtocol
+from mrjob.step import MRStep
+import codecs
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+import retail_ingest  # For the csv column numbers, CUSTOMER and STOCKCODE name the kinds of sums in this file
+from retail_ingest import parse_line, day_of
+
+CUSTOMER, STOCKCODE = 'c', 's'
+
+
+def save_cube(path, day_name_values):
+    """
+    Saves the sums as columns: for the customers the day, index of the customer and revenue, for the stockcodes the
+    day, index of the stockcode, quantity and revenue. The rows are sorted on day, so a period is a contiguous slice.
+    The names themselves are only stored once, in the customers and stockcodes arrays.
+    """
+    rows = {CUSTOMER: [], STOCKCODE: []}
+    for (kind, day, name), value in day_name_values:
+        rows[kind].append((day, name, value))
+
+    arrays = {}
+    for kind, prefix in ((CUSTOMER, 'customer'), (STOCKCODE, 'stockcode')):
+        names = sorted({name for _, name, _ in rows[kind]})
+        index = {name: i for i, name in enumerate(names)}
+        rows[kind].sort(key=lambda row: (row[0], index[row[1]]))
+        arrays[prefix + 's'] = np.array(names, dtype=str)
+        arrays[prefix + '_days'] = np.array([row[0] for row in rows[kind]], dtype=np.int32)
+        arrays[prefix + '_ids'] = np.array([index[row[1]] for row in rows[kind]], dtype=np.int32)
+        if kind == CUSTOMER:
+            arrays['customer_revenues'] = np.array([row[2] for row in rows[kind]], dtype=np.float64)
+        else:
+            arrays['stockcode_quantities'] = np.array([row[2][0] for row in rows[kind]], dtype=np.float64)
+            arrays['stockcode_revenues'] = np.array([row[2][1] for row in rows[kind]], dtype=np.float64)
+    np.savez_compressed(path, **arrays)
+
+
+class RetailCube(InstrumentedJob, ParallelJob, MRJob):
+    # The sums are read back in by the job itself to save the cube (parse_output), so they are written as plain JSON
+    OUTPUT_PROTOCOL = JSONProtocol
+    # The mrtools package has to be uploaded along with the job when the tasks run in their own directory
+    DIRS = ['../mrtools#mrtools']
+    FILES = ['retail_ingest.py']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(RetailCube, self).configure_args()
+        # This is only used when launching the job, so it doesn't have to be passed to the mappers and reducers
+        self.arg_parser.add_argument('--cube', default='retail_cube.npz', help='File to save the cube to')
+
+    @staticmethod
+    def mapper_day_with_sums(_, line):
+        line = parse_line(line)
+        if line:  # parse_line returns None for the file header
+            stockcode, customer = line[retail_ingest.STOCKCODE], line[retail_ingest.CUSTOMER]
+            quantity, price = float(line[retail_ingest.QUANTITY]), float(line[retail_ingest.PRICE])
+            day = day_of(line[retail_ingest.INVOICE_DATE])
+
+            # Blank customers and empty stockcodes are left out, like in Task_3.py and Task_4.py
+            if customer:
+                yield (CUSTOMER, day, customer), quantity*price
+            if stockcode:
+                yield (STOCKCODE, day, stockcode), (quantity, quantity*price)
+
+    @staticmethod
+    def sum_values(kind_day_name, values):
+        # The revenues of a customer are summed, for a stockcode both the quantities and the revenues are summed
+        if kind_day_name[0] == CUSTOMER:
+            yield kind_day_name, sum(values)
+        else:
+            values = list(values)
+            yield kind_day_name, (sum(value[0] for value in values), sum(value[1] for value in values))
+
+    def run_job(self):
+        # Instead of writing the sums to stdout they are collected and saved as the arrays of the cube
+        self.set_up_logging(quiet=self.options.quiet, verbose=self.options.verbose,
+                            stream=codecs.getwriter('utf_8')(self.stderr))
+        with self.make_runner() as runner:
+            runner.run()
+            save_cube(self.options.cube, self.parse_output(runner.cat_output()))
+
+    def steps(self):
+        return [
+            MRStep(mapper=self.mapper_day_with_sums,
+                   combiner=self.sum_values,
+                   reducer=self.sum_values)
+        ]
+
+
+if __name__ == '__main__':
+    RetailCube.run()
@@ -0,0 +1,142 @@
+# Keeps the sums of the first step of Task_3.py or Task_4.py in a state file, so when a new month or year of sales is
+# added only the new file has to be processed. The top customers or items are then calculated again from the state.
+
+# To process the first files and create the state:
+# python "2 Online Retail\incremental.py" --task 3 --state "2 Online Retail\task_3_state.json.gz" "2 Online Retail\retail0910.csv" > "2 Online Retail\Task_3.txt"
+
+# To add a new file later on, files which are already in the state are skipped:
+# python "2 Online Retail\incremental.py" --task 3 --state "2 Online Retail\task_3_state.json.gz" "2 Online Retail\retail0910.csv" "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_3.txt"
+
+# Any other arguments are passed on to the job, for example to process the new files on a local cluster:
+# python "2 Online Retail\incremental.py" --task 4 --state "2 Online Retail\task_4_state.json.gz" -r local --no-bootstrap-mrjob "2 Online Retail\retail1011.csv" > "2 Online Retail\Task_4.txt"
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+from Task_3 import YearlyTopCustomers
+from Task_4 import MostPopularItems
+
+JOBS = {'3': YearlyTopCustomers, '4': MostPopularItems}
+
+log = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    # The size and modification time are used to notice when a file which was already processed has been changed
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def load_state(path):
+    """
+    The state holds the files which have been processed and the sums of the first step of the job as [key, value]
+    pairs. It is stored as gzipped JSON, the keys are read back as tuples so they can be used in a dict.
+    """
+    if not os.path.exists(path):
+        return {}, {}
+    with gzip.open(path, 'rt', encoding='utf-8') as state_file:
+        state = json.load(state_file)
+    return state['processed'], {_hashable(key): value for key, value in state['sums']}
+
+
+def save_state(path, processed, sums):
+    # Written to a temporary file first, so the old state is kept when something goes wrong while writing
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as state_file:
+        json.dump({'processed': processed, 'sums': [[key, value] for key, value in sums.items()]}, state_file,
+                  separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+def _hashable(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def add_sums(sums, key, value):
+    # Values are either a single sum (Task 3) or a list of sums (Task 4)
+    key = _hashable(key)
+    if key not in sums:
+        sums[key] = value
+    elif isinstance(value, list):
+        sums[key] = [old + new for old, new in zip(sums[key], value)]
+    else:
+        sums[key] += value
+
+
+def partial_sums(job_class, job_args, paths):
+    # Run the first step of the job on the new files only and read back its sums
+    job = job_class(job_args + ['--partials_only'] + paths)
+    with job.make_runner() as runner:
+        runner.run()
+        yield from job.parse_output(runner.cat_output())
+
+
+def run_steps(job, steps, pairs):
+    """
+    Runs the remaining steps of the job on the summed pairs in this process, these steps only select the top values
+    so they are cheap compared to the first step.
+    """
+    for step in steps:
+        grouped = {}
+        if step['mapper_init']:
+            step['mapper_init']()
+        mapper = step['mapper'] or (lambda key, value: ((key, value),))
+        for key, value in pairs:
+            for new_key, new_value in mapper(key, value):
+                grouped.setdefault(_hashable(new_key), []).append(new_value)
+        if step['mapper_final']:
+            for new_key, new_value in step['mapper_final']():
+                grouped.setdefault(_hashable(new_key), []).append(new_value)
+
+        pairs = []
+        if step['reducer_init']:
+            step['reducer_init']()
+        reducer = step['reducer'] or (lambda key, values: ((key, value) for value in values))
+        for key in sorted(grouped, key=lambda key: (key is not None, key)):
+            pairs.extend(reducer(key, iter(grouped[key])))
+        if step['reducer_final']:
+            pairs.extend(step['reducer_final']())
+    return pairs
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run Task_3.py or Task_4.py on new files only')
+    parser.add_argument('--task', choices=sorted(JOBS), required=True, help='The task of which the state is kept')
+    parser.add_argument('--state', required=True, help='Gzipped JSON file which holds the state of earlier runs')
+    options, job_args = parser.parse_known_args(args)
+    job_class = JOBS[options.task]
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+
+    # Let the job parse its own arguments, so its input files can be told apart from its other arguments
+    job = job_class(job_args)
+    paths = [path for path in job.options.args if path != '-']
+    job_args = [arg for arg in job_args if arg not in job.options.args]
+
+    processed, sums = load_state(options.state)
+    new_paths = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in processed:
+            new_paths.append(path)
+        elif processed[key] != file_signature(path):
+            # The sums of the old version of the file can't be taken out of the state again
+            parser.error(f'{path} has changed since it was processed, remove {options.state} to start over')
+        else:
+            log.info(f'Skipping {path}, it was already processed')
+
+    if new_paths:
+        for key, value in partial_sums(job_class, job_args, new_paths):
+            add_sums(sums, key, value)
+        processed.update({os.path.abspath(path): file_signature(path) for path in new_paths})
+        save_state(options.state, processed, sums)
+
+    # Calculate the results from all sums in the state
+    protocol = job.output_protocol()
+    for key, value in run_steps(job, job.steps()[1:], sums.items()):
+        sys.stdout.buffer.write(protocol.write(key, value) + b'\n')
+
+
+if __name__ == '__main__':
+    main()
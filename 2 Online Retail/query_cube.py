@@ -0,0 +1,128 @@
+# Answers top-k questions from the cube made by cube.py, a query only sums the days of the period so it takes
+# milliseconds instead of another pass over the csv files.
+
+# The results of Task_3.py and Task_4.py:
+# python "2 Online Retail\query_cube.py" --cube="2 Online Retail\retail_cube.npz" --task 3 > "2 Online Retail\Task_3.txt"
+# python "2 Online Retail\query_cube.py" --cube="2 Online Retail\retail_cube.npz" --task 4 > "2 Online Retail\Task_4.txt"
+
+# Other questions, for example the top 5 customers per quarter of 2010 or the items sold the most in December 2010:
+# python "2 Online Retail\query_cube.py" --cube="2 Online Retail\retail_cube.npz" --by customer --period quarter --top_k 5 --start 2010-01-01 --end 2010-12-31
+# python "2 Online Retail\query_cube.py" --cube="2 Online Retail\retail_cube.npz" --by stockcode --measure quantity --period all --start 2010-12-01 --end 2010-12-31
+
+import argparse
+import datetime
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.topk import top_k
+
+PERIODS = ('all', 'year', 'quarter', 'month', 'day')
+
+
+def load_cube(path):
+    # All arrays are loaded at once, the cube is small compared to the csv files it was made from
+    with np.load(path) as cube:
+        return {name: cube[name] for name in cube.files}
+
+
+def period_of(day, period):
+    # The key of the period a day (number of days since 1/1/0001) falls in
+    date = datetime.date.fromordinal(day)
+    if period == 'year':
+        return date.year
+    if period == 'quarter':
+        return f'{date.year} Q{(date.month - 1) // 3 + 1}'
+    if period == 'month':
+        return f'{date.year}-{date.month:02}'
+    if period == 'day':
+        return date.isoformat()
+    return 'all'
+
+
+def period_slices(days, period, start=None, end=None):
+    """
+    Returns (period, first row, end row) for every period between the start and end date (both included). The rows of
+    the cube are sorted on day, so the rows of a period are next to each other.
+    """
+    first = 0 if start is None else np.searchsorted(days, start.toordinal(), side='left')
+    last = len(days) if end is None else np.searchsorted(days, end.toordinal(), side='right')
+    unique_days, starts = np.unique(days[first:last], return_index=True)
+    ends = np.append(starts[1:], last - first)
+    slices = []
+    for day, day_start, day_end in zip(unique_days, starts + first, ends + first):
+        key = period_of(int(day), period)
+        if slices and slices[-1][0] == key:
+            slices[-1][2] = day_end
+        else:
+            slices.append([key, day_start, day_end])
+    return [tuple(period_slice) for period_slice in slices]
+
+
+def totals(cube, by, measures, first, end):
+    # Sums the measures per customer or stockcode over the rows of a period, only the ones which occur are returned
+    ids = cube[by + '_ids'][first:end]
+    present = np.unique(ids)
+    sums = [np.bincount(ids, weights=cube[f'{by}_{measure}'][first:end], minlength=len(cube[by + 's']))[present]
+            for measure in measures]
+    return cube[by + 's'][present], sums
+
+
+def top_k_per_period(cube, by='customer', measure='revenues', k=10, period='year', start=None, end=None):
+    # Yields the period and a list of (total, name) of the k highest totals in that period
+    for key, first, end_row in period_slices(cube[by + '_days'], period, start, end):
+        names, (sums,) = totals(cube, by, (measure,), first, end_row)
+        yield key, top_k(zip(sums.tolist(), names.tolist()), k)
+
+
+def task_3(cube, k=10):
+    # The same output as Task_3.py: the customers with the highest revenue per year
+    from Task_3 import CustomOutputProtocol
+    protocol = CustomOutputProtocol()
+    for year, revenue_customers in top_k_per_period(cube, 'customer', 'revenues', k, 'year'):
+        for revenue_customer in revenue_customers:
+            yield protocol.write(year, revenue_customer)
+
+
+def task_4(cube):
+    # The same output as Task_4.py: the item which was sold the most and the item with the highest revenue
+    from Task_4 import CustomOutputProtocol
+    protocol = CustomOutputProtocol()
+    names, (quantities, revenues) = totals(cube, 'stockcode', ('quantities', 'revenues'), 0, None)
+    quantity_revenue_codes = list(zip(quantities.tolist(), revenues.tolist(), names.tolist()))
+    yield protocol.write(None, top_k(quantity_revenue_codes, 1, score=0, tie=2)[0])
+    yield protocol.write(None, top_k(quantity_revenue_codes, 1, score=1, tie=2)[0])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Answer top-k questions from the cube made by cube.py')
+    parser.add_argument('--cube', default='retail_cube.npz', help='The file saved by cube.py')
+    parser.add_argument('--task', choices=('3', '4'), help='Give the output of Task_3.py or Task_4.py')
+    parser.add_argument('--by', choices=('customer', 'stockcode'), default='customer')
+    parser.add_argument('--measure', choices=('revenue', 'quantity'), default='revenue',
+                        help='Rank on revenue or quantity, the quantity is only known per stockcode')
+    parser.add_argument('--period', choices=PERIODS, default='year')
+    parser.add_argument('--top_k', type=int, default=10)
+    parser.add_argument('--start', type=datetime.date.fromisoformat, help='First day to include, as YYYY-MM-DD')
+    parser.add_argument('--end', type=datetime.date.fromisoformat, help='Last day to include, as YYYY-MM-DD')
+    options = parser.parse_args(args)
+    if options.by == 'customer' and options.measure == 'quantity':
+        parser.error('The quantity is only known per stockcode')
+
+    cube = load_cube(options.cube)
+    if options.task == '3':
+        lines = task_3(cube, options.top_k)
+    elif options.task == '4':
+        lines = task_4(cube)
+    else:
+        measure = 'quantities' if options.measure == 'quantity' else 'revenues'
+        lines = (bytes(f'{key}\t{name}\t{round(total, 2)}', 'utf-8')
+                 for key, total_names in top_k_per_period(cube, options.by, measure, options.top_k, options.period,
+                                                          options.start, options.end)
+                 for total, name in total_names)
+    for line in lines:
+        sys.stdout.buffer.write(line + b'\n')
+
+
+if __name__ == '__main__':
+    main()
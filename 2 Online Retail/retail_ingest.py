@@ -0,0 +1,69 @@
+"""
+Reading the retail csv files. The description field can contain commas, in which case it is quoted, so lines are parsed
+with the csv module instead of being split on commas. The columns are:
+Invoice, StockCode, Description, Quantity, InvoiceDate, Price, Customer ID, Country
+"""
+import csv
+import datetime
+import functools
+
+STOCKCODE, QUANTITY, INVOICE_DATE, PRICE, CUSTOMER = 1, 3, 4, 5, 6
+
+
+def parse_line(line):
+    # Returns the fields of a line, or None for the header of the file
+    fields = next(csv.reader((line,)))
+    if fields[0] == 'Invoice':
+        return None
+    return fields
+
+
+@functools.lru_cache(maxsize=None)
+def _year_of_day(day):
+    return datetime.datetime.strptime(day, '%m/%d/%Y').year
+
+
+def year_of(invoice_date):
+    # An invoice date looks like '12/1/2009 07:45:00', only the day is parsed and there are few distinct days, so the
+    # year of each day is cached instead of parsing every date again
+    return _year_of_day(invoice_date.split(' ', 1)[0])
+
+
+@functools.lru_cache(maxsize=None)
+def _ordinal_of_day(day):
+    return datetime.datetime.strptime(day, '%m/%d/%Y').toordinal()
+
+
+def day_of(invoice_date):
+    # The day of an invoice date as the number of days since 1/1/0001, which is cached in the same way as the year
+    return _ordinal_of_day(invoice_date.split(' ', 1)[0])
+
+
+def read_chunks(path, chunk_size):
+    """
+    Reads a csv file in pandas DataFrames of chunk_size lines. Only the columns which are used are read, the stockcodes
+    and customers are kept as text. pandas is only needed for this, so it is imported here.
+    """
+    import pandas as pd
+    return pd.read_csv(path, usecols=[STOCKCODE, QUANTITY, INVOICE_DATE, PRICE, CUSTOMER], header=0,
+                       names=['stockcode', 'quantity', 'invoice_date', 'price', 'customer'],
+                       dtype={'stockcode': str, 'quantity': float, 'invoice_date': str, 'price': float, 'customer': str},
+                       keep_default_na=False, chunksize=chunk_size)
+
+
+def revenue_per_year_customer(chunk):
+    # Sum the revenue of each (year, customer) within a chunk, leaving out the blank customers
+    chunk = chunk[chunk['customer'] != '']
+    days = chunk['invoice_date'].str.split(' ', n=1).str[0]
+    years = days.map({day: _year_of_day(day) for day in days.unique()})
+    revenues = (chunk['quantity'] * chunk['price']).groupby([years, chunk['customer']]).sum()
+    for (year, customer), revenue in revenues.items():
+        yield (int(year), customer), float(revenue)
+
+
+def quantity_revenue_per_stockcode(chunk):
+    # Sum the quantity and revenue of each stockcode within a chunk, leaving out the empty stockcodes
+    chunk = chunk[chunk['stockcode'] != '']
+    sums = chunk.assign(revenue=chunk['quantity'] * chunk['price']).groupby('stockcode')[['quantity', 'revenue']].sum()
+    for stockcode, quantity, revenue in sums.itertuples():
+        yield stockcode, (float(quantity), float(revenue))
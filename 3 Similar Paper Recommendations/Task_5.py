@@ -1,97 +1,145 @@
 # To run inline:
 # python "3 Similar Paper Recommendations\Task_5.py" --source_file="3 Similar Paper Recommendations\summary.txt" "3 Similar Paper Recommendations\arxivData.json" > "3 Similar Paper Recommendations\Task_5.txt"
 
-# Due to mapper_raw cannot be run on a local cluster!
+# The JSON array is read by one mapper per file. To split it over multiple mappers, which also works on a local cluster,
+# convert it to JSON lines once with arxiv_reader.py:
+# python "3 Similar Paper Recommendations\arxiv_reader.py" "3 Similar Paper Recommendations\arxivData.json" "3 Similar Paper Recommendations\arxivData.jsonl"
+# python "3 Similar Paper Recommendations\Task_5.py" -r local --no-bootstrap-mrjob --input_format=jsonl --source_file="3 Similar Paper Recommendations\summary.txt" "3 Similar Paper Recommendations\arxivData.jsonl" > "3 Similar Paper Recommendations\Task_5.txt"
+
+# To look up the 10 most similar papers (TF-IDF cosine similarity) of one or more summaries in the index made by
+# paper_index.py, the summaries are given as input files instead:
+# python "3 Similar Paper Recommendations\Task_5.py" --index="3 Similar Paper Recommendations\paper_index" --top_k=10 "3 Similar Paper Recommendations\summary.txt"
 
 from mrjob.job import MRJob
 from mrjob.step import MRStep
 import json
-import nltk
+import numpy as np
 import operator
-from sklearn.feature_extraction.text import CountVectorizer
-import re
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from arxiv_reader import read_papers
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from paper_index import load_index, most_similar
+from paper_text import PaperWords
+from scipy.sparse import csr_matrix
 
 class CustomOutputProtocol:
     # This class will be used to format our output, output needs to be casted to bytes
     def write(self, key, value):
+        if key is not None:  # The similar papers of the summary in file key, when querying the index
+            return bytes(f"{key}: Arxiv id '{value[0]}' has a cosine similarity of {round(value[1], 3)}", 'utf-8')
         return bytes(f"Arxiv id '{value[0]}' has the most similar summary"
                      f" with a cosine similarity of {round(value[1], 3)}", 'utf-8')
 
-class MostSimilarArticle(MRJob):
+class MostSimilarArticle(InstrumentedJob, ParallelJob, MRJob):
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Upload the helpers and the shared mrtools package along with the job
+    FILES = ['arxiv_reader.py', 'paper_index.py', 'paper_text.py']
+    DIRS = ['../mrtools#mrtools']
 
     def configure_args(self):
         # This function allows adding extra command line arguments
         super(MostSimilarArticle, self).configure_args()
         # We'll add an argument 'summary_file' which takes in a file containing the summary of a paper
         self.add_file_arg('--source_file', help='Location of txt file which contains the summary of a paper')
+        self.add_passthru_arg('--batch_size', type=int, default=5000,
+                              help='Amount of summaries which are compared to the source at once')
+        self.add_passthru_arg('--input_format', choices=('json', 'jsonl'), default='json',
+                              help='json for a JSON array of papers (arxivData.json), jsonl for one paper per line')
+        self.add_passthru_arg('--index',
+                              help='Directory of an index made by paper_index.py, the input files are then the '
+                                   'summaries to look up')
+        self.add_passthru_arg('--top_k', type=int, default=10,
+                              help='Amount of most similar papers to output per summary when using --index')
+        add_text_tables_arg(self)
 
-    @staticmethod
-    def cosine_similarity(vector_a, vector_b):
-        # Compute the cosine similarity between two matrices
-        dot = sum(a * b for a, b in zip(vector_a, vector_b))
-        norm_a = sum(a*a for a in vector_a) ** 0.5
-        norm_b = sum(b * b for b in vector_b) ** 0.5
-        return dot/(norm_a*norm_b)
+    def dirs(self):
+        # The index is uploaded along with the job, the mappers find it in their working directory as paper_index
+        if self.options.index:
+            return super(MostSimilarArticle, self).dirs() + [f'{self.options.index}#paper_index']
+        return super(MostSimilarArticle, self).dirs()
 
     @staticmethod
-    def preprocessor(text):
-        """
-        This function takes one parameter 'text' which is a string and removes newline commands,
-        converts the characters to lowercase and filters out everything which is not a word and returns the result
-        """
-        text = text.replace('\\n', ' ')
-        text = text.lower()
-        text = re.sub('[^a-zA-Z]+', ' ', text)
-        return text
+    def get_id_summary(_, uri):
+        # The papers are read from the JSON array one at a time, so the whole file never has to be in memory
+        for paper in read_papers(uri):
+            yield paper['id'], paper['summary']
 
     @staticmethod
-    def tokenize_lemmatize(text):
-        """
-        This function takes one parameter 'text' which is a string and word tokenizes it,
-        it then lemmatizes this text and returns the result
-        """
-        text = nltk.tokenize.word_tokenize(text)
-        lemmatizer = nltk.stem.wordnet.WordNetLemmatizer()
-        text = [lemmatizer.lemmatize(word) for word in text]
-        return text
+    def get_id_summary_line(_, line):
+        # With JSON lines every line is one paper and the file can be split over multiple mappers
+        paper = json.loads(line)
+        yield paper['id'], paper['summary']
 
-    def get_id_summary(self, _, uri):
+    def init_get_cosine_similarity(self):
         """
-        # Read the text we're comparing to into a string variable
-        with open(self.options.source_file, "r") as source_file:
-            source = source_file.read()
+        The source is only vectorized once. Words which are not in the source add nothing to the dot product, so only
+        the words of the source get a column, the norm of a summary is taken over all of its words.
         """
-        # Read in the actual data
-        with open(uri, 'r') as input_file:
-            data = json.load(input_file)  # Will be a of dictionaries
-        # For each object (info about one specific paper)
-        for paper in data:
-            yield paper['id'], paper['summary']
-            """
-            # vectorize the summary and source file
-            cv = CountVectorizer((source, paper['summary']), preprocessor=self.preprocessor,
-                                 stop_words='english', tokenizer=self.tokenize_lemmatize)
-            vector1, vector2 = cv.fit_transform((source, paper['summary'])).toarray()
-            # Get the cosine similarity between the two files
-            cosine_similarity = self.cosine_similarity(vector1, vector2)
-            # yield no key and the (paper_id, cosine_similarity) as value
-            yield None, (paper['id'], cosine_similarity)
-            """
-
-    def init_get_cosine_similarity(self):
+        self.words = PaperWords(text_tables(self.options))
         with open(self.options.source_file, "r") as source_file:
-            self.source = source_file.read()
+            source_counts = self.words.word_counts(source_file.read())
+        self.columns = {word: column for column, word in enumerate(source_counts)}
+        self.source = np.array(list(source_counts.values()), dtype=np.float64)
+        self.source /= np.linalg.norm(self.source)  # L2 normalized, so the dot product gives the cosine similarity
+        self.ids = []
+        self.summaries = []
 
     def get_cosine_similarity(self, id, summary):
-        cv = CountVectorizer((self.source, summary), preprocessor=self.preprocessor,
-                             stop_words='english', tokenizer=self.tokenize_lemmatize)
-        vector1, vector2 = cv.fit_transform((self.source, summary)).toarray()
-        # Get the cosine similarity between the two files
-        cosine_similarity = self.cosine_similarity(vector1, vector2)
+        # The summaries are compared to the source in batches of --batch_size
+        self.ids.append(id)
+        self.summaries.append(summary)
+        if len(self.ids) >= self.options.batch_size:
+            yield from self.compare_batch()
+
+    def final_get_cosine_similarity(self):
+        if self.ids:
+            yield from self.compare_batch()
+        # Report how many words were not in the table of lemmas of --text_tables
+        self.increment_counter('text tables', 'lemma misses', self.words.lemma_misses)
+
+    def compare_batch(self):
+        """
+        Builds a sparse matrix of the word counts of the batch and compares all summaries at once with a single
+        matrix-vector product, only the most similar summary of the batch is passed on.
+        """
+        indptr, indices, data, norms = [0], [], [], []
+        for summary in self.summaries:
+            counts = self.words.word_counts(summary)
+            for word, count in counts.items():
+                column = self.columns.get(word)
+                if column is not None:
+                    indices.append(column)
+                    data.append(count)
+            indptr.append(len(indices))
+            norms.append(sum(count * count for count in counts.values()) ** 0.5)
+        matrix = csr_matrix((np.array(data, dtype=np.float64), indices, indptr),
+                            shape=(len(self.ids), len(self.columns)))
+        norms = np.array(norms)
+        # A summary without any words has no similarity with the source
+        cosine_similarities = np.divide(matrix @ self.source, norms, out=np.zeros(len(norms)), where=norms > 0)
+        most_similar = int(np.argmax(cosine_similarities))
         # yield no key and the (paper_id, cosine_similarity) as value
-        yield None, (id, cosine_similarity)
+        yield None, (self.ids[most_similar], float(cosine_similarities[most_similar]))
+        self.ids = []
+        self.summaries = []
+
+    def init_query(self):
+        # The arrays of the index are memory mapped, so only the postings of the words of the summaries are read. The
+        # parallel executor doesn't upload the index, there the tasks find it at --index itself
+        self.index = load_index(self.options.index if os.path.isdir(self.options.index) else 'paper_index')
+        self.words = PaperWords(text_tables(self.options))
+
+    def query_source(self, path, uri):
+        # Every input file is the summary of a paper, its --top_k most similar papers are looked up in the index
+        with open(path, 'r') as source_file:
+            counts = self.words.word_counts(source_file.read())
+        for paper_id, cosine_similarity in most_similar(self.index, counts, self.options.top_k):
+            yield uri, (paper_id, cosine_similarity)
 
     @staticmethod
     def max_value(_, id_cosine_similarity):
@@ -102,10 +150,14 @@ class MostSimilarArticle(MRJob):
         yield None, most_similar
 
     def steps(self):
+        if self.options.index:
+            return [MRStep(mapper_init=self.init_query, mapper_raw=self.query_source)]
         return [
-            MRStep(mapper_raw=self.get_id_summary),
+            MRStep(mapper_raw=self.get_id_summary if self.options.input_format == 'json' else None,
+                   mapper=self.get_id_summary_line if self.options.input_format == 'jsonl' else None),
             MRStep(mapper_init=self.init_get_cosine_similarity,
                    mapper=self.get_cosine_similarity,
+                   mapper_final=self.final_get_cosine_similarity,
                    combiner=self.max_value,
                    reducer=self.max_value)
         ]
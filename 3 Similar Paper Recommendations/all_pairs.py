@@ -0,0 +1,209 @@
+# Finds the most similar papers of every paper, instead of only the most similar paper of summary.txt. Comparing all
+# pairs of papers takes far too long, so papers are only compared when they are likely to be similar: every paper gets
+# a MinHash signature of its words, which is split into bands, and papers which have the same rows in a band end up in
+# the same bucket. The cosine similarity (of the word counts, like Task_5.py) is only calculated within these buckets.
+# More bands or fewer rows per band find more of the similar papers (recall), but make the job slower.
+
+# To run inline:
+# python "3 Similar Paper Recommendations\all_pairs.py" --bands=20 --rows=5 --top_k=5 "3 Similar Paper Recommendations\arxivData.json" > "3 Similar Paper Recommendations\all_pairs.txt"
+
+# To run on a local cluster, with the papers converted to JSON lines by arxiv_reader.py:
+# python "3 Similar Paper Recommendations\all_pairs.py" -r local --no-bootstrap-mrjob --input_format=jsonl "3 Similar Paper Recommendations\arxivData.jsonl" > "3 Similar Paper Recommendations\all_pairs.txt"
+
+# To also measure the recall against comparing all pairs, for a sample of 200 papers (this is logged to stderr):
+# python "3 Similar Paper Recommendations\all_pairs.py" --recall_sample=200 "3 Similar Paper Recommendations\arxivData.json" > "3 Similar Paper Recommendations\all_pairs.txt"
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.util import to_lines
+import codecs
+import collections
+import json
+import logging
+import numpy as np
+import os
+import random
+import re
+import sys
+import zlib
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from mrtools.topk import top_k
+from arxiv_reader import read_papers
+from paper_text import PaperWords
+from scipy.sparse import csr_matrix
+
+log = logging.getLogger(__name__)
+
+_PRIME = (1 << 31) - 1  # The hashes are calculated modulo this prime, so the products still fit in 64 bits
+_BLOCK_SIZE = 1000  # Amount of papers of a bucket which are compared to the others at once
+
+
+class CustomOutputProtocol:
+    # This class will be used to format our output, output needs to be casted to bytes
+    _LINE = re.compile(r"Arxiv id '(.*)' is similar to '(.*)' with a cosine similarity of (\S+)")
+
+    def write(self, key, value):
+        return bytes(f"Arxiv id '{key}' is similar to '{value[1]}' with a cosine similarity of {round(value[0], 3)}",
+                     'utf-8')
+
+    def read(self, line):
+        # Used to measure the recall, the similarity is rounded
+        paper_id, other_id, similarity = self._LINE.match(line.decode('utf-8')).groups()
+        return paper_id, (float(similarity), other_id)
+
+
+def vectors(counts_list):
+    # The L2 normalized sparse vectors of the word counts of some papers, with a column for every word in them
+    columns = {}
+    indptr, indices, data = [0], [], []
+    for counts in counts_list:
+        for word, count in counts:
+            indices.append(columns.setdefault(word, len(columns)))
+            data.append(count)
+        indptr.append(len(indices))
+    matrix = csr_matrix((np.array(data, dtype=np.float64), indices, indptr), shape=(len(counts_list), len(columns)))
+    matrix.data /= np.repeat(np.sqrt(np.bincount(np.repeat(np.arange(len(counts_list)), np.diff(indptr)),
+                                                 weights=matrix.data ** 2, minlength=len(counts_list))),
+                             np.diff(indptr))
+    return matrix
+
+
+def most_similar_pairs(ids, matrix, others_ids, others, k):
+    """
+    Yields (id, (cosine similarity, other id)) for the k most similar others of every paper, leaving out the paper
+    itself and others without any word in common. The papers are compared in blocks so at most _BLOCK_SIZE rows of
+    similarities are in memory.
+    """
+    for start in range(0, len(ids), _BLOCK_SIZE):
+        similarities = (matrix[start:start + _BLOCK_SIZE] @ others.T).toarray()
+        for row, paper_id in enumerate(ids[start:start + _BLOCK_SIZE]):
+            similar = [(similarity, other_id) for similarity, other_id in zip(similarities[row].tolist(), others_ids)
+                       if similarity > 0 and other_id != paper_id]
+            for similarity_other in top_k(similar, k):
+                yield paper_id, similarity_other
+
+
+class SimilarPaperPairs(InstrumentedJob, ParallelJob, MRJob):
+    # Set the output protocol to our own, custom protocol
+    OUTPUT_PROTOCOL = CustomOutputProtocol
+    # Upload the helpers and the shared mrtools package along with the job
+    FILES = ['arxiv_reader.py', 'paper_text.py']
+    DIRS = ['../mrtools#mrtools']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(SimilarPaperPairs, self).configure_args()
+        self.add_passthru_arg('--input_format', choices=('json', 'jsonl'), default='json',
+                              help='json for a JSON array of papers (arxivData.json), jsonl for one paper per line')
+        self.add_passthru_arg('--bands', type=int, default=20, help='Amount of bands of the MinHash signature')
+        self.add_passthru_arg('--rows', type=int, default=5, help='Amount of rows (hashes) in each band')
+        self.add_passthru_arg('--top_k', type=int, default=5, help='Amount of most similar papers to output per paper')
+        add_text_tables_arg(self)
+        # This is only used when launching the job, so it doesn't have to be passed to the mappers and reducers
+        self.arg_parser.add_argument('--recall_sample', type=int, default=0,
+                                     help='Amount of papers for which the result is compared to comparing all pairs')
+
+    def init_signatures(self):
+        # The same hash functions (a * x + b) % _PRIME have to be used by every mapper, so they come from a fixed seed
+        generator = np.random.RandomState(0)
+        size = self.options.bands * self.options.rows
+        self.a = generator.randint(1, _PRIME, size=size).astype(np.uint64)[:, None]
+        self.b = generator.randint(0, _PRIME, size=size).astype(np.uint64)[:, None]
+        self.words = PaperWords(text_tables(self.options))
+
+    def get_band_buckets(self, _, uri):
+        for paper in read_papers(uri):
+            yield from self.band_buckets(paper)
+
+    def get_band_buckets_line(self, _, line):
+        yield from self.band_buckets(json.loads(line))
+
+    def band_buckets(self, paper):
+        """
+        yield (band, hash of the rows of the band) as key and (paper_id, words) as value for every band of the
+        MinHash signature of the words of the summary
+        """
+        counts = self.words.word_counts(paper['summary'])
+        if not counts:  # Without any words a paper isn't similar to any other paper
+            return
+        hashes = np.array([zlib.crc32(word.encode('utf-8')) for word in counts], dtype=np.uint64) % _PRIME
+        signature = ((self.a * hashes[None, :] + self.b) % _PRIME).min(axis=1)
+        # The words are passed on as a single string, which is much cheaper to pass between the steps than a list
+        words = ' '.join(counts.elements())
+        for band, rows in enumerate(signature.reshape(self.options.bands, self.options.rows)):
+            yield (band, zlib.crc32(rows.tobytes())), (paper['id'], words)
+
+    def compare_bucket(self, _, id_words):
+        # yield the --top_k most similar papers within the bucket for every paper in it
+        id_words = sorted(id_words)
+        if len(id_words) > 1:
+            self.increment_counter('lsh', 'compared papers', len(id_words))
+            ids = [paper_id for paper_id, _ in id_words]
+            matrix = vectors([collections.Counter(words.split()).items() for _, words in id_words])
+            yield from most_similar_pairs(ids, matrix, ids, matrix, self.options.top_k)
+
+    def max_similar(self, paper_id, similarity_others):
+        # A pair can be in the same bucket for multiple bands, so each other paper is only kept once
+        unique = {other_id: similarity for similarity, other_id in similarity_others}
+        for similarity_other in top_k([(similarity, other_id) for other_id, similarity in unique.items()],
+                                      self.options.top_k):
+            yield paper_id, similarity_other
+
+    def run_job(self):
+        """
+        With --recall_sample the output is also compared to the most similar papers found by comparing a sample of
+        the papers to all papers, the recall is the fraction of those which were found
+        """
+        if not self.options.recall_sample:
+            return super(SimilarPaperPairs, self).run_job()
+        self.set_up_logging(quiet=self.options.quiet, verbose=self.options.verbose,
+                            stream=codecs.getwriter('utf_8')(self.stderr))
+        found = {}
+        with self.make_runner() as runner:
+            runner.run()
+            for line in to_lines(runner.cat_output()):
+                self.stdout.write(line)
+                paper_id, (_, other_id) = self.output_protocol().read(line.rstrip(b'\r\n'))
+                found.setdefault(paper_id, set()).add(other_id)
+        self.stdout.flush()
+        log.info(f'Recall of the {self.options.top_k} most similar papers: {self.recall(found):.3f}')
+
+    def recall(self, found):
+        # Compare a random sample of the papers to all papers
+        papers = []
+        for path in self.options.args:
+            if self.options.input_format == 'json':
+                papers.extend(read_papers(path))
+            else:
+                with open(path, 'r', encoding='utf-8') as input_file:
+                    papers.extend(json.loads(line) for line in input_file)
+        words = PaperWords(text_tables(self.options))
+        id_counts = [(paper['id'], list(words.word_counts(paper['summary']).items())) for paper in papers]
+        id_counts = sorted((paper_id, counts) for paper_id, counts in id_counts if counts)
+        ids = [paper_id for paper_id, _ in id_counts]
+        matrix = vectors([counts for _, counts in id_counts])
+        sample = sorted(random.Random(0).sample(range(len(ids)), min(self.options.recall_sample, len(ids))))
+
+        expected = hits = 0
+        for paper_id, (_, other_id) in most_similar_pairs([ids[row] for row in sample], matrix[sample], ids, matrix,
+                                                           self.options.top_k):
+            expected += 1
+            hits += other_id in found.get(paper_id, ())
+        return hits / expected if expected else 1.0
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.init_signatures,
+                   mapper_raw=self.get_band_buckets if self.options.input_format == 'json' else None,
+                   mapper=self.get_band_buckets_line if self.options.input_format == 'jsonl' else None,
+                   reducer=self.compare_bucket),
+            MRStep(combiner=self.max_similar,
+                   reducer=self.max_similar)
+        ]
+
+
+if __name__ == '__main__':
+    SimilarPaperPairs.run()
@@ -0,0 +1,80 @@
+# Reads the papers of arxivData.json one at a time instead of loading the whole file, and converts the file to JSON
+# lines (one paper per line) so Hadoop or the local runner can split it over multiple mappers.
+
+# To convert arxivData.json to JSON lines:
+# python "3 Similar Paper Recommendations\arxiv_reader.py" "3 Similar Paper Recommendations\arxivData.json" "3 Similar Paper Recommendations\arxivData.jsonl"
+
+import json
+import sys
+
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(file, chunk_size=1 << 16):
+    """
+    Yields the elements of the JSON array in a file one by one. The file is read in chunks of chunk_size characters and
+    only the chunk and the element which is being decoded are kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    end_of_file = False
+    started = False
+
+    while True:
+        # Skip the whitespace and the separators between the elements
+        while position < len(buffer) and (buffer[position] in _WHITESPACE or (started and buffer[position] == ',')):
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('The file does not contain a JSON array')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if end_of_file:
+                    raise
+            else:
+                # The element is only complete when it is followed by a separator, a number at the end of the buffer
+                # might still continue in the next chunk
+                following = end
+                while following < len(buffer) and buffer[following] in _WHITESPACE:
+                    following += 1
+                if following < len(buffer) and buffer[following] in ',]':
+                    yield element
+                    position = following
+                    continue
+                if end_of_file:
+                    raise ValueError(f'Expected , or ] after the element at position {end}')
+        elif end_of_file:
+            raise ValueError('The JSON array is not closed')
+
+        # More of the file is needed, the part which was already decoded is dropped. An element which is larger than a
+        # chunk makes the reads grow, so it isn't decoded again for every chunk
+        buffer = buffer[position:]
+        position = 0
+        chunk = file.read(max(chunk_size, len(buffer)))
+        end_of_file = not chunk
+        buffer += chunk
+
+
+def read_papers(path):
+    # The papers of a JSON array file (like arxivData.json)
+    with open(path, 'r', encoding='utf-8') as input_file:
+        yield from iter_json_array(input_file)
+
+
+def convert_to_json_lines(json_path, json_lines_path):
+    # Writes every paper as a single line, newlines within a summary are escaped by json.dumps
+    with open(json_lines_path, 'w', encoding='utf-8') as output_file:
+        for paper in read_papers(json_path):
+            output_file.write(json.dumps(paper, separators=(',', ':')) + '\n')
+
+
+if __name__ == '__main__':
+    convert_to_json_lines(sys.argv[1], sys.argv[2])
@@ -0,0 +1,157 @@
+# Builds a TF-IDF index of the arXiv summaries, so Task_5.py can compare summaries to the papers without processing the
+# whole corpus again for every query. The index is a directory of numpy files which are memory mapped when querying:
+# the postings of every word (the papers it occurs in with their weights) and the normalized vector of every paper.
+
+# To run inline:
+# python "3 Similar Paper Recommendations\paper_index.py" --index_dir="3 Similar Paper Recommendations\paper_index" "3 Similar Paper Recommendations\arxivData.json"
+
+# To run on a local cluster, with the papers converted to JSON lines by arxiv_reader.py:
+# python "3 Similar Paper Recommendations\paper_index.py" -r local --no-bootstrap-mrjob --input_format=jsonl --index_dir="3 Similar Paper Recommendations\paper_index" "3 Similar Paper Recommendations\arxivData.jsonl"
+
+from mrjob.job import MRJob
+from mrjob.protocol import JSONProtocol
+from mrjob.step import MRStep
+import codecs
+import json
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.text_tables import add_text_tables_arg, text_tables
+from mrtools.topk import top_k
+from arxiv_reader import read_papers
+from paper_text import PaperWords
+from scipy.sparse import csr_matrix
+
+
+def save_index(directory, term_postings):
+    """
+    Saves the index from the postings of every word, a list of (paper id, count). The weights are TF-IDF with the
+    smoothed idf of scikit-learn's TfidfVectorizer and the vector of every paper is L2 normalized, so the cosine
+    similarity with a paper is the sum of the products of the weights of the words it shares with a query.
+    """
+    terms, postings = [], []
+    for term, term_posting in sorted(term_postings):
+        terms.append(term)
+        postings.append(term_posting)
+    paper_ids = sorted({paper_id for term_posting in postings for paper_id, _ in term_posting})
+    rows = {paper_id: row for row, paper_id in enumerate(paper_ids)}
+
+    document_frequencies = np.array([len(term_posting) for term_posting in postings], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(document_frequencies)))
+    papers = np.array([rows[paper_id] for term_posting in postings for paper_id, _ in term_posting], dtype=np.int32)
+    weights = np.array([count for term_posting in postings for _, count in term_posting], dtype=np.float64)
+
+    idf = np.log((1 + len(paper_ids)) / (1 + document_frequencies)) + 1
+    weights *= np.repeat(idf, document_frequencies)
+    weights /= np.sqrt(np.bincount(papers, weights=weights * weights, minlength=len(paper_ids)))[papers]
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'terms.json'), 'w', encoding='utf-8') as terms_file:
+        json.dump(terms, terms_file)
+    with open(os.path.join(directory, 'paper_ids.json'), 'w', encoding='utf-8') as paper_ids_file:
+        json.dump(paper_ids, paper_ids_file)
+    np.save(os.path.join(directory, 'idf.npy'), idf)
+    # The postings of a word are postings_papers[postings_indptr[word]:postings_indptr[word + 1]]
+    np.save(os.path.join(directory, 'postings_indptr.npy'), indptr)
+    np.save(os.path.join(directory, 'postings_papers.npy'), papers)
+    np.save(os.path.join(directory, 'postings_weights.npy'), weights)
+    # The same weights ordered per paper, the words of a paper are vectors_terms[vectors_indptr[paper]:...]
+    vectors = csr_matrix((weights, papers, indptr), shape=(len(terms), len(paper_ids))).tocsc()
+    np.save(os.path.join(directory, 'vectors_indptr.npy'), vectors.indptr)
+    np.save(os.path.join(directory, 'vectors_terms.npy'), vectors.indices)
+    np.save(os.path.join(directory, 'vectors_weights.npy'), vectors.data)
+
+
+def load_index(directory):
+    # The arrays are memory mapped, so a query only reads the postings of the words it contains
+    with open(os.path.join(directory, 'terms.json'), 'r', encoding='utf-8') as terms_file:
+        index = {'terms': {term: row for row, term in enumerate(json.load(terms_file))}}
+    with open(os.path.join(directory, 'paper_ids.json'), 'r', encoding='utf-8') as paper_ids_file:
+        index['paper_ids'] = json.load(paper_ids_file)
+    for name in ('idf', 'postings_indptr', 'postings_papers', 'postings_weights'):
+        index[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+    return index
+
+
+def most_similar(index, counts, k):
+    """
+    Returns the k (paper id, cosine similarity) most similar to a text with the given word counts. Like a fitted
+    TfidfVectorizer, words which are not in the index are left out. Only the papers which share a word with the text
+    get a score.
+    """
+    rows = [index['terms'][word] for word in counts if word in index['terms']]
+    if not rows:
+        return []
+    query = np.array([counts[word] for word in counts if word in index['terms']], dtype=np.float64)
+    query *= index['idf'][rows]
+    query /= np.linalg.norm(query)
+
+    indptr = index['postings_indptr']
+    papers = np.concatenate([index['postings_papers'][indptr[row]:indptr[row + 1]] for row in rows])
+    weights = np.concatenate([index['postings_weights'][indptr[row]:indptr[row + 1]] * weight
+                              for row, weight in zip(rows, query)])
+    candidates, candidate_of_posting = np.unique(papers, return_inverse=True)
+    scores = np.bincount(candidate_of_posting, weights=weights)
+    paper_ids = index['paper_ids']
+    return [(paper_id, score) for score, paper_id in
+            top_k(zip(scores.tolist(), (paper_ids[candidate] for candidate in candidates)), k)]
+
+
+class PaperIndex(InstrumentedJob, ParallelJob, MRJob):
+    # The postings are read back in by the job itself to save the index, so they are written in the internal format
+    OUTPUT_PROTOCOL = JSONProtocol
+    # Upload the helpers and the shared mrtools package along with the job
+    FILES = ['arxiv_reader.py', 'paper_text.py']
+    DIRS = ['../mrtools#mrtools']
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(PaperIndex, self).configure_args()
+        self.add_passthru_arg('--input_format', choices=('json', 'jsonl'), default='json',
+                              help='json for a JSON array of papers (arxivData.json), jsonl for one paper per line')
+        add_text_tables_arg(self)
+        # This is only used when launching the job, so it doesn't have to be passed to the mappers and reducers
+        self.arg_parser.add_argument('--index_dir', default='paper_index', help='Directory to save the index to')
+
+    def init_words(self):
+        self.words = PaperWords(text_tables(self.options))
+
+    def get_word_postings(self, _, uri):
+        for paper in read_papers(uri):
+            yield from self.word_postings(paper)
+
+    def get_word_postings_line(self, _, line):
+        yield from self.word_postings(json.loads(line))
+
+    def word_postings(self, paper):
+        # yield every word of the summary with (paper_id, count) as value
+        for word, count in self.words.word_counts(paper['summary']).items():
+            yield word, (paper['id'], count)
+
+    @staticmethod
+    def collect_postings(word, postings):
+        # yield the word with the list of all its (paper_id, count)
+        yield word, sorted(postings)
+
+    def run_job(self):
+        # Instead of writing the postings to stdout they are collected and saved as the arrays of the index
+        self.set_up_logging(quiet=self.options.quiet, verbose=self.options.verbose,
+                            stream=codecs.getwriter('utf_8')(self.stderr))
+        with self.make_runner() as runner:
+            runner.run()
+            save_index(self.options.index_dir, self.parse_output(runner.cat_output()))
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.init_words,
+                   mapper_raw=self.get_word_postings if self.options.input_format == 'json' else None,
+                   mapper=self.get_word_postings_line if self.options.input_format == 'jsonl' else None,
+                   reducer=self.collect_postings)
+        ]
+
+
+if __name__ == '__main__':
+    PaperIndex.run()
@@ -0,0 +1,61 @@
+"""
+Turning the summary of a paper into the words which are compared. This is the same as the CountVectorizer which was
+used before: the preprocessor, the tokenizer which lemmatizes and leaving out the english stop words of scikit-learn.
+"""
+import collections
+import os
+import re
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.text_tables import contractions, english_stop_words, lemmatizer
+
+_NOT_A_WORD = re.compile('[^a-zA-Z]+')
+
+
+def preprocessor(text):
+    """
+    This function takes one parameter 'text' which is a string and removes newline commands,
+    converts the characters to lowercase and filters out everything which is not a word and returns the result
+    """
+    text = text.replace('\\n', ' ')
+    text = text.lower()
+    text = _NOT_A_WORD.sub(' ', text)
+    return text
+
+
+class PaperWords:
+    """
+    Counts the words of summaries. After the preprocessor only lowercase letters and spaces are left, on which nltk's
+    word_tokenize only splits a few contractions (e.g. 'cannot'), so the text is split on whitespace and these are
+    split up afterwards.
+
+    With the tables of mrtools/text_tables.py the stop words, contractions and lemmas are read from these and nltk is
+    only imported for words which are not in the table of lemmas. Every lemma which is looked up is remembered, the
+    same words come back in almost every summary.
+    """
+    def __init__(self, tables=None):
+        if tables is None:
+            self.stop_words, self.contractions, self.lemmas = english_stop_words(), contractions(), {}
+        else:
+            self.stop_words, self.contractions = tables['english_stop_words'], tables['contractions']
+            self.lemmas = tables['lemmas']
+        self.lemma_misses = 0  # Amount of words which had to be lemmatized by nltk
+
+    def lemmatize(self, word):
+        lemma = self.lemmas.get(word)
+        if lemma is None:
+            self.lemma_misses += 1
+            lemma = self.lemmas[word] = lemmatizer().lemmatize(word)
+        return lemma
+
+    def tokenize_lemmatize(self, text):
+        """
+        This function takes one parameter 'text' which is a string and word tokenizes it,
+        it then lemmatizes this text and returns the result
+        """
+        return [self.lemmatize(token) for word in text.split() for token in self.contractions.get(word, (word,))]
+
+    def word_counts(self, text):
+        # Counts the words of a text the way the CountVectorizer did, so without the stop words
+        return collections.Counter(word for word in self.tokenize_lemmatize(preprocessor(text))
+                                   if word not in self.stop_words)
@@ -1,7 +1,26 @@
 import numpy as np
 
-A = np.loadtxt('A.txt')
-B = np.loadtxt('B.txt')
+
+def load_matrix(path):
+    # Dense matrices are whitespace separated, sparse matrices are stored as 'row,col,value' lines
+    with open(path, 'r') as matrix_file:
+        sparse = ',' in matrix_file.readline()
+    if not sparse:
+        return np.loadtxt(path)
+    entries = np.loadtxt(path, delimiter=',', ndmin=2)
+    rows, cols = entries[:, 0].astype(int), entries[:, 1].astype(int)
+    matrix = np.zeros((rows.max() + 1, cols.max() + 1))
+    matrix[rows, cols] = entries[:, 2]
+    return matrix
+
+
+A = load_matrix('A.txt')
+B = load_matrix('B.txt')
+
+# Rows/columns which only contain zeros are not stored in a sparse file, so the common dimension might not match
+common_size = max(A.shape[1], B.shape[0])
+A = np.pad(A, ((0, 0), (0, common_size - A.shape[1])))
+B = np.pad(B, ((0, common_size - B.shape[0]), (0, 0)))
 
 C_matmul = np.matmul(A, B)
 C_mrjob = np.zeros((C_matmul.shape))
@@ -11,4 +30,4 @@ with open('C.txt', 'r') as C_file:
         row, col, value = line.split(',')
         C_mrjob[int(row), int(col)] = float(value)
 
-print(np.linalg.norm(C_mrjob-C_matmul))
\ No newline at end of file
+print(np.linalg.norm(C_mrjob-C_matmul))
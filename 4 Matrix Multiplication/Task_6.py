@@ -1,91 +1,400 @@
 # To run inline:
 # python "4 Matrix Multiplication\Task_6.py" "4 Matrix Multiplication\A.txt" "4 Matrix Multiplication\B.txt" > "4 Matrix Multiplication\C.txt"
 
-# Due to mapper_raw cannot be run on a local cluster!
+# To multiply the matrices in tiles of 100 x 100 elements (much less data has to be shuffled):
+# python "4 Matrix Multiplication\Task_6.py" --block_size=100 "4 Matrix Multiplication\A.txt" "4 Matrix Multiplication\B.txt" > "4 Matrix Multiplication\C.txt"
 
+# To multiply sparse matrices stored as 'row,col,value' lines, only the non-zero elements are used:
+# python "4 Matrix Multiplication\Task_6.py" --sparse "4 Matrix Multiplication\A_sparse.txt" "4 Matrix Multiplication\B_sparse.txt" > "4 Matrix Multiplication\C.txt"
+
+# Binary matrices (.npy) are memory mapped and split into ranges of rows, this can also be run on a local cluster:
+# python "4 Matrix Multiplication\Task_6.py" -r local --no-bootstrap-mrjob --memmap --block_size=100 "4 Matrix Multiplication\A.npy" "4 Matrix Multiplication\B.npy" > "4 Matrix Multiplication\C.txt"
+# Raw float64 files don't store their dimensions, give the amount of columns of each file in the same order:
+# python "4 Matrix Multiplication\Task_6.py" --memmap --raw_columns=17,11 "4 Matrix Multiplication\A.bin" "4 Matrix Multiplication\B.bin" > "4 Matrix Multiplication\C.txt"
+
+# To write a summary of the records, bytes and time per phase of every step (e.g. how much the combiner saves):
+# python "4 Matrix Multiplication\Task_6.py" --profile="4 Matrix Multiplication\profile" "4 Matrix Multiplication\A.txt" "4 Matrix Multiplication\B.txt" > "4 Matrix Multiplication\C.txt"
+
+# Due to mapper_raw the text formats cannot be run on a local cluster! They do run on the parallel executor of mrtools,
+# which is used when no runner is given on a machine with multiple cores, e.g. with 4 processes:
+# python "4 Matrix Multiplication\Task_6.py" --processes=4 "4 Matrix Multiplication\A.txt" "4 Matrix Multiplication\B.txt" > "4 Matrix Multiplication\C.txt"
+
+from mrjob.compat import jobconf_from_env
 from mrjob.job import MRJob
+from mrjob.parse import is_uri
+from mrjob.protocol import JSONProtocol
 from mrjob.step import MRStep
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # To import the shared mrtools package
+from mrtools.executor import ParallelJob
+from mrtools.instrumentation import InstrumentedJob
+from mrtools.protocols import PackedProtocol
 import numpy as np
+import math
+
+# The mappers of --memmap only see their own file, the launcher tells them the order of the files on the command line
+_MATRIX_INPUTS = 'mrtools.matrix.inputs'
 
 class CustomOutputProtocol:
     # This class will be used to format our output, output needs to be casted to bytes
     def write(self, key, value):
         return bytes(f"{key[0]}, {key[1]}, {value}", 'utf-8')
 
-class MatrixMultiplication(MRJob):
+class MatrixMultiplication(InstrumentedJob, ParallelJob, MRJob):
     MRJob.matrix1 = ()
     MRJob.matrix2 = ()
     # Set the output protocol to our own, custom protocol
     OUTPUT_PROTOCOL = CustomOutputProtocol
+    # The mrtools package has to be uploaded along with the job when the tasks run in their own directory
+    DIRS = ['../mrtools#mrtools']
+    # Secondary sort: the values of each key reach the reducer in sorted order, as the shared index k comes first in
+    # every value, the element (or block) of matrix1 arrives right before the one of matrix2 it is multiplied with
+    SORT_VALUES = True
+    # The dimensions of the matrices are kept in MRJob.matrix1/matrix2 by the mapper_raw of the text formats, so on the
+    # parallel executor these tasks run one after the other in the launcher, which passes the dimensions on
+    MAPPER_RAW_IN_LAUNCHER = True
+
+    def configure_args(self):
+        # This function allows adding extra command line arguments
+        super(MatrixMultiplication, self).configure_args()
+        # We'll add an argument 'block_size', when given the matrices are multiplied block by block instead of per element
+        self.add_passthru_arg('--block_size', type=int, default=0,
+                              help='Multiply the matrices in tiles of block_size x block_size elements, '
+                                   'when omitted every element of the result is calculated separately')
+        # We'll add an argument 'sparse', when given the matrices are read as 'row,col,value' lines (like C.txt)
+        self.add_passthru_arg('--sparse', action='store_true',
+                              help='Read the matrices as sparse row,col,value triplets, the first file is the left '
+                                   'operand, zeros are skipped and only the non-zero elements of the result are written')
+        # We'll add an argument 'memmap', when given the matrices are memory mapped .npy or raw float64 files
+        self.add_passthru_arg('--memmap', action='store_true',
+                              help='Read the matrices as memory mapped .npy (or raw float64) files, the rows are split '
+                                   'into ranges which are read by different mappers')
+        self.add_passthru_arg('--split_rows', type=int, default=1000,
+                              help='Amount of rows read by one mapper when using --memmap')
+        self.add_passthru_arg('--raw_columns',
+                              help='Amount of columns of raw float64 matrices, comma separated in the order of the '
+                                   'input files (e.g. 17,11), a single value is used for both. .npy files store this '
+                                   'themselves')
+
+    def load_args(self, args):
+        super(MatrixMultiplication, self).load_args(args)
+        if self.options.memmap and not self.is_task() and len(self.options.args) != 2:
+            self.arg_parser.error('--memmap multiplies exactly two matrices, give two input files')
+        # The amount of columns of every raw input file, in the order of the input files
+        try:
+            self.raw_columns = [int(columns) for columns in self.options.raw_columns.split(',')] \
+                if self.options.raw_columns else []
+        except ValueError:
+            self.arg_parser.error(f'--raw_columns takes comma separated integers, not {self.options.raw_columns}')
+        if len(self.raw_columns) > 2 or any(columns <= 0 for columns in self.raw_columns):
+            self.arg_parser.error('--raw_columns takes one positive amount of columns, or one for each input file')
+
+    def jobconf(self):
+        jobconf = super(MatrixMultiplication, self).jobconf()
+        if self.options.memmap and not self.is_task():
+            jobconf = dict(jobconf)
+            jobconf[_MATRIX_INPUTS] = json.dumps([path if is_uri(path) else os.path.abspath(path)
+                                                  for path in self.options.args])
+        return jobconf
 
     @staticmethod
-    def read_matrix(path, uri):
-        matrix = np.loadtxt(path)  # path is locally accessible
-        name = uri.split('\\')[-1] # Get the filename
+    def input_index(uri):
+        # The position of an input file on the command line, 0 for the first matrix and 1 for the second
+        inputs = json.loads(jobconf_from_env(_MATRIX_INPUTS, '[]'))
+        uri = uri if is_uri(uri) else os.path.abspath(uri)
+        if uri not in inputs:
+            raise ValueError(f'{uri} is not one of the input files {inputs}')
+        return inputs.index(uri)
+
+    def internal_protocol(self):
+        # Blocks are passed between the steps in a compact binary format, every float takes 8 bytes instead of up to 24
+        # characters of JSON. Single elements and sparse triplets are smaller as well, but take longer to encode.
+        return PackedProtocol() if self.options.block_size else JSONProtocol()
+
+    @staticmethod
+    def matrix_id():
+        # The matrices are named by the order in which they are read (0 or 1), this is a lot shorter than the filename
+        return 1 if MRJob.matrix1 else 0
+
+    @staticmethod
+    def register_matrix(name, shape):
         if not MRJob.matrix1:  # check whether matrix1 already has a value
-            MRJob.matrix1 = (name, matrix.shape)  # set it equal to the filename along with the matrix dimensions
+            MRJob.matrix1 = (name, shape)  # set it equal to the filename along with the matrix dimensions
         else:  # matrix1 already exists
             # amount of columns in matrix1 are equal to rows in matrix2, we can do matrix1 * matrix2
-            if MRJob.matrix1[1][1] == matrix.shape[0]:
-                MRJob.matrix2 = (name, matrix.shape)
+            if MRJob.matrix1[1][1] == shape[0]:
+                MRJob.matrix2 = (name, shape)
             else:
-                assert matrix.shape[1] == MRJob.matrix1[1][0], 'Matrices not multiplicable'
+                assert shape[1] == MRJob.matrix1[1][0], 'Matrices not multiplicable'
                 MRJob.matrix2 = MRJob.matrix1  # We'll always do matrix1 * matrix2
-                MRJob.matrix1 = (name, matrix.shape)
-            MRJob.matrix2 = (name, matrix.shape)
+                MRJob.matrix1 = (name, shape)
+
+    @staticmethod
+    def read_matrix(path, uri):
+        matrix = np.loadtxt(path)  # path is locally accessible
+        name = MatrixMultiplication.matrix_id()
+        MatrixMultiplication.register_matrix(name, matrix.shape)
         for row_index, row in enumerate(matrix):
             for column_index, element in enumerate(row):
                 yield (name, row_index, column_index, element), None
 
+    @staticmethod
+    def read_sparse(path, uri):
+        """
+        A sparse matrix does not tell us its dimensions (trailing rows/columns may only contain zeros), so we can't
+        deduce which matrix should come first. We'll always do first file * second file.
+        """
+        name = MatrixMultiplication.matrix_id()
+        entries = []
+        with open(path, 'r') as matrix_file:  # path is locally accessible
+            for line in matrix_file:
+                if line.strip():  # Skip empty lines
+                    row, column, value = line.split(',')
+                    entries.append((int(row), int(column), float(value)))
+        # The dimensions are not needed to multiply sparse matrices, but we'll keep track of them anyway
+        shape = (max((row for row, _, _ in entries), default=-1) + 1,
+                 max((column for _, column, _ in entries), default=-1) + 1)
+        if not MRJob.matrix1:  # check whether matrix1 already has a value
+            MRJob.matrix1 = (name, shape)
+        else:
+            MRJob.matrix2 = (name, shape)
+        for row_index, column_index, element in entries:
+            if element != 0:  # Zeros don't contribute anything to the result, so we don't send them
+                yield (name, row_index, column_index, element), None
+
+    def read_blocks(self, path, uri):
+        matrix = np.loadtxt(path)  # path is locally accessible
+        name = self.matrix_id()
+        self.register_matrix(name, matrix.shape)
+        size = self.options.block_size
+        # Cut the matrix into tiles of size x size elements, the tiles on the edges may be smaller
+        for row_block, row_start in enumerate(range(0, matrix.shape[0], size)):
+            for column_block, column_start in enumerate(range(0, matrix.shape[1], size)):
+                block = matrix[row_start:row_start + size, column_start:column_start + size]
+                yield (name, row_block, column_block), block.tolist()
+
+    @staticmethod
+    def element_tuples(side, row_index, column_index, value, rows1, columns2):
+        """
+        Send an element to every cell of the result it contributes to. side is 0 for an element of matrix1 and 1 for an
+        element of matrix2, rows1 is the amount of rows in matrix1 and columns2 the amount of columns in matrix2.
+        The shared index k (column for matrix1, row for matrix2) comes first in the value so that it is sorted on.
+        """
+        if side == 0:  # tuple is from matrix1
+            for column in range(columns2):  # For each column in matrix2
+                yield (row_index, column), (column_index, side, value)
+        else:  # tuple is from matrix2
+            for row in range(rows1):  # For each row in matrix1
+                yield (row, column_index), (row_index, side, value)
+
     @staticmethod
     def generate_tuples(info, _):
+        name, row_index, column_index, value = tuple(info)
+        side = 0 if name == MRJob.matrix1[0] else 1
+        return MatrixMultiplication.element_tuples(side, row_index, column_index, value,
+                                                   MRJob.matrix1[1][0], MRJob.matrix2[1][1])
+
+    @staticmethod
+    def generate_sparse_tuples(info, _):
+        """
+        C[i, j] is the sum over k of matrix1[i, k] * matrix2[k, j], so we join the elements of both matrices on this
+        shared index k: the column index for matrix1 and the row index for matrix2.
+        """
         name, row_index, column_index, value = tuple(info)
         if name == MRJob.matrix1[0]:  # tuple is from matrix1
-            for column in range(MRJob.matrix2[1][1]):  # For each column in matrix2
-                yield (row_index, column), (name, column_index, value)
+            yield column_index, (0, row_index, value)
         else:  # tuple is from matrix2
-            for row in range(MRJob.matrix1[1][0]):  # For each row in matrix1
-                yield (row, column_index), (name, row_index, value)
+            yield row_index, (1, column_index, value)
 
     @staticmethod
-    def combine_tuples(row_column, name_row_or_col_valuelist):
+    def multiply_shared_index(_, side_row_or_col_values):
         """
-        This combiner does not change anything drastically, it almost increases the time it takes to run jobs by a
-        factor of ~1.5 but it decreases the amount of data sent to the reducers by ~1/3. So while sacrificing time
-        performance, it will reduce redundant transfer in an actual DFS. Note that when running this program on one
-        machine that without this combiner more RAM is necessary when initialising the reducer. This is because input
-        sent to the reducer is  sorted in memory, this might cause a 'MemoryError' when the system does not have
-        sufficient RAM to process large matrices.
+        Every non-zero element of matrix1 in column k has to be multiplied with every non-zero element of matrix2 in
+        row k. Each product is a part of the sum for C[row, column]. The values are sorted on their side, so only the
+        elements of matrix1 have to be kept in memory, the elements of matrix2 are multiplied as they arrive.
         """
-        yield row_column, name_row_or_col_valuelist
+        matrix1_values = []
+        for side, row_or_col, value in side_row_or_col_values:
+            if side == 0:
+                matrix1_values.append((row_or_col, value))
+            else:
+                for row, value1 in matrix1_values:
+                    yield (row, row_or_col), value1 * value
+
+    @staticmethod
+    def sum_products(row_column, products):
+        # Sum the products, elements which are zero are not written so the result is sparse as well
+        value = sum(products)
+        if value != 0:
+            yield row_column, value
 
     @staticmethod
-    def calculate_dot(row_column, name_row_or_col_valuelist):
-        """
-        MrJob automatically sorts the values of identical keys when passing the data to a reducer,
-        so the values for a 'row_column' key will already be in the following sorted order:
-        [[matrix1 name, 0, value], [matrix1 name, 1, value], ..., [matrix1 name, n, value], [matrix2 name, 0, value],
-        [matrix2 name, 1, value], ..., [matrix2 name, n, value]]
-        """
-        row_column = tuple(row_column)
-        name_row_or_col_valuelist = tuple(name_row_or_col_valuelist)
-        # The common size of the two matrices, also equal to MRJob.matrix2[1][0] and len(name_row_or_col_valuelist)//2
-        common_size = MRJob.matrix1[1][1]
-
-        # Get the values belonging to the matrix with the 'smallest' name (in sorted order), note that this can be
-        # either matrix1 or matrix2
-        matrixA_values = [value for name_row_or_col_value in name_row_or_col_valuelist
-                          for name, row, value in name_row_or_col_value][0:common_size]
-        # Get the values belonging to the matrix with the 'highest' name (in sorted order based on 'row_or_col')
-        # note that this can be either matrix1 or matrix2
-        matrixB_values = [value for name_row_or_col_value in name_row_or_col_valuelist
-                          for name, row, value in name_row_or_col_value][common_size::]
-        # As the tuples were sorted based on their row/column we know they are in the same order so we can zip them,
-        # and take the sum of the products to obtain the value for that specific 'row_column'
-        value = sum(val1*val2 for val1, val2 in zip(matrixA_values, matrixB_values))
-        yield row_column, value
+    def block_tuples(side, row_block, column_block, block, rows1, columns2, size):
+        """
+        C[I, J] is the sum over K of matrix1[I, K] @ matrix2[K, J], where I, J and K are block indices. So each block of
+        matrix1 is sent to every block column of the result and each block of matrix2 to every block row of the result.
+        The shared block index K is sent along so the reducer knows which blocks have to be multiplied with each other.
+        """
+        if side == 0:  # block is from matrix1
+            for column in range(math.ceil(columns2 / size)):  # For each block column in matrix2
+                yield (row_block, column), (column_block, side, block)
+        else:  # block is from matrix2
+            for row in range(math.ceil(rows1 / size)):  # For each block row in matrix1
+                yield (row, column_block), (row_block, side, block)
+
+    def generate_blocks(self, info, block):
+        name, row_block, column_block = info
+        side = 0 if name == MRJob.matrix1[0] else 1
+        return self.block_tuples(side, row_block, column_block, block,
+                                 MRJob.matrix1[1][0], MRJob.matrix2[1][1], self.options.block_size)
+
+    def open_matrix(self, uri):
+        """
+        Memory map a binary matrix, only the rows which are actually used will be read from disk. A .npy file stores
+        its dimensions, a raw file of float64 values needs the amount of columns to be given on the command line.
+        """
+        if uri.endswith('.npy'):
+            return np.load(uri, mmap_mode='r')
+        if not self.raw_columns:
+            raise ValueError(f'{uri} is not a .npy file, give its amount of columns with --raw_columns')
+        columns = self.raw_columns[self.input_index(uri) if len(self.raw_columns) > 1 else 0]
+        size = os.path.getsize(uri)
+        if size % (8 * columns):  # 8 bytes per float64
+            raise ValueError(f'{uri} holds {size / 8:g} float64 values, which do not fill rows of {columns} columns')
+        return np.memmap(uri, dtype=np.float64, mode='r').reshape(-1, columns)
+
+    def describe_matrix(self, _, uri):
+        # Only the dimensions are read here, the matrix itself is read by the mappers of the next step
+        yield None, (self.input_index(uri), uri, self.open_matrix(uri).shape)
+
+    def plan_splits(self, _, index_uri_shapes):
+        """
+        Now that the dimensions of both matrices are known we can decide which one comes first. SORT_VALUES sorts the
+        values on their encoding, so they are put back in the order of the command line first: square matrices are
+        multiplied as first file * second file. Both matrices are then split into ranges of rows, every range is read
+        by a mapper of the next step. When multiplying in blocks the ranges are a multiple of the block size so that a
+        block never spans two mappers.
+        """
+        (_, uri1, shape1), (_, uri2, shape2) = sorted(index_uri_shapes)
+        if shape1[1] != shape2[0]:  # We'll always do matrix1 * matrix2
+            assert shape2[1] == shape1[0], 'Matrices not multiplicable'
+            (uri1, shape1), (uri2, shape2) = (uri2, shape2), (uri1, shape1)
+        split_rows = self.options.split_rows
+        if self.options.block_size:
+            split_rows = math.ceil(split_rows / self.options.block_size) * self.options.block_size
+        for side, (uri, shape) in enumerate(((uri1, shape1), (uri2, shape2))):
+            for start in range(0, shape[0], split_rows):
+                yield (uri, start, min(start + split_rows, shape[0])), (side, shape1[0], shape2[1])
+
+    def read_split(self, split, side_rows1_columns2):
+        uri, start, stop = split
+        side, rows1, columns2 = side_rows1_columns2
+        rows = self.open_matrix(uri)[start:stop]  # Only this range of rows is read from disk
+        size = self.options.block_size
+        if size:
+            for row_start in range(0, rows.shape[0], size):
+                for column_start in range(0, rows.shape[1], size):
+                    block = rows[row_start:row_start + size, column_start:column_start + size]
+                    yield from self.block_tuples(side, (start + row_start) // size, column_start // size,
+                                                 block.tolist(), rows1, columns2, size)
+        else:
+            for row_index, row in enumerate(rows, start):
+                for column_index, element in enumerate(row):
+                    yield from self.element_tuples(side, row_index, column_index, float(element), rows1, columns2)
+
+    @staticmethod
+    def combine_tuples(row_column, k_side_values):
+        """
+        The values are sorted, so when a mapper produced both matrix1[i, k] and matrix2[k, j] they are next to each
+        other. These pairs are multiplied and summed into one partial sum (side 2), the other values are passed on
+        unchanged. Note that the elements of both matrices only meet in one mapper when they come from the same input
+        split, when every matrix is read by its own mapper nothing can be combined. The combiner ratio in the summary
+        of --profile shows how much is saved for some matrices.
+        """
+        partial_sum = None
+        previous = None
+        for k, side, value in k_side_values:
+            if side == 2:  # A partial sum of an earlier combiner
+                partial_sum = (partial_sum or 0) + value
+            elif side == 1 and previous is not None and previous[0] == k:
+                partial_sum = (partial_sum or 0) + previous[2] * value
+                previous = None
+            else:
+                if previous is not None:  # previous has no partner in this mapper
+                    yield row_column, previous
+                previous = (k, side, value)
+        if previous is not None:
+            yield row_column, previous
+        if partial_sum is not None:
+            yield row_column, (-1, 2, partial_sum)
+
+    @staticmethod
+    def calculate_dot(row_column, k_side_values):
+        """
+        Thanks to SORT_VALUES the values of a 'row_column' key arrive sorted on the shared index k: matrix1[i, k] (side 0)
+        is directly followed by matrix2[k, j] (side 1). We only have to remember the previous value and keep a running
+        sum of the products, so the memory used does not depend on the size of the matrices. Partial sums of the
+        combiner (side 2) are added as they are.
+        """
+        value = 0
+        previous = None
+        for k, side, element in k_side_values:
+            if side == 2:
+                value += element
+            elif side == 1 and previous is not None and previous[0] == k:
+                value += previous[1] * element
+                previous = None
+            elif side == 0:
+                previous = (k, element)
+        yield tuple(row_column), value
+
+    def calculate_block(self, block_index, k_side_blocks):
+        """
+        The blocks are sorted on the shared block index K, so a block of matrix1 is directly followed by the block of
+        matrix2 it has to be multiplied with. We multiply them with numpy and keep a running sum, which gives us the
+        complete block of the result. Each element of this block is yielded separately so the output has the same
+        format as the element-wise multiplication.
+        """
+        result = 0
+        previous = None
+        for k, side, block in k_side_blocks:
+            if side == 1 and previous is not None and previous[0] == k:
+                result = result + previous[1] @ np.array(block)
+                previous = None
+            elif side == 0:
+                previous = (k, np.array(block))
+        # Convert the indices within the block to indices within the result
+        row_start, column_start = block_index[0] * self.options.block_size, block_index[1] * self.options.block_size
+        for (row, column), value in np.ndenumerate(result):
+            yield (row_start + row, column_start + column), float(value)
 
     def steps(self):
+        if self.options.memmap:
+            # The dimensions are passed along with the row ranges instead of being kept in MRJob.matrix1/matrix2, so
+            # every step can run in its own process
+            second_step = MRStep(mapper=self.read_split, reducer=self.calculate_block) if self.options.block_size \
+                else MRStep(mapper=self.read_split, combiner=self.combine_tuples, reducer=self.calculate_dot)
+            return [
+                MRStep(mapper_raw=self.describe_matrix,
+                       reducer=self.plan_splits),
+                second_step
+            ]
+        if self.options.sparse:
+            return [
+                MRStep(mapper_raw=self.read_sparse),
+                MRStep(mapper=self.generate_sparse_tuples,
+                       reducer=self.multiply_shared_index),
+                MRStep(combiner=self.sum_products,
+                       reducer=self.sum_products)
+            ]
+        if self.options.block_size:
+            return [
+                MRStep(mapper_raw=self.read_blocks),
+                MRStep(mapper=self.generate_blocks,
+                       reducer=self.calculate_block)
+            ]
         return [
             MRStep(mapper_raw=self.read_matrix),
             # We need to perform this in two distinct steps, as the dimensions of both matrices need to be known
@@ -0,0 +1,193 @@
+"""
+Synthetic inputs for the benchmarks, in the same formats as the files of the tasks: the IMDB title basics (tsv), the
+retail invoices (csv, descriptions with commas are quoted), the arXiv papers (a JSON array and JSON lines, with the
+summary to compare in summary.txt) and the matrices (dense text, .npy and sparse 'row,col,value' files). The data comes
+from a fixed seed, so a scale always gives the same files. At scale 1 there are BASE_SIZES titles, invoice lines and
+papers and the matrices are MATRIX_SIZE x MATRIX_SIZE, the scale multiplies the amount of titles, lines, papers and
+matrix elements.
+
+To generate the inputs at 10 times the base size (run.py does this itself when the data is missing):
+python benchmarks\\generate.py --scale=10 benchmarks\\data\\10
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import numpy as np
+
+# Raised whenever the generated files change, so run.py generates the inputs again
+VERSION = 2
+BASE_SIZES = {'imdb': 20000, 'retail': 20000, 'arxiv': 2000}
+MATRIX_SIZE = 40
+SPARSE_DENSITY = 0.05
+
+_GENRES = ['Drama', 'Comedy', 'Documentary', 'Romance', 'Action', 'Thriller', 'Horror', 'Crime', 'Adventure',
+           'Family', 'Mystery', 'Fantasy', 'Sci-Fi', 'Animation', 'Biography', 'History', 'Music', 'War', 'Western']
+# Drama is by far the largest genre, like in the real data
+_GENRE_WEIGHTS = [30] + [1 / rank for rank in range(1, len(_GENRES))]
+_TITLE_TYPES = ['movie', 'short', 'tvEpisode', 'tvSeries', 'video']
+_TITLE_TYPE_WEIGHTS = [45, 15, 30, 5, 5]
+_STOP_WORDS = ['the', 'of', 'a', 'and', 'in', 'la', 'le', 'der', 'il', 'untitled']
+_COUNTRIES = ['United Kingdom', 'France', 'Germany', 'EIRE', 'Netherlands', 'Spain', 'Belgium', 'Switzerland']
+_COLOURS = ['RED', 'BLUE', 'PINK', 'WHITE', 'GREEN', 'IVORY', 'BLACK']
+
+
+def words(count, generator):
+    # Lowercase made up words of 3 to 9 letters, the same words for the same generator
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = set()
+    while len(vocabulary) < count:
+        vocabulary.add(''.join(generator.choice(letters) for _ in range(generator.randint(3, 9))))
+    return sorted(vocabulary)
+
+
+def zipf_weights(count):
+    # Few words are very common and most words are rare, like in real text
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def imdb_tsv(path, titles, seed=0):
+    """
+    Writes title.basics.tsv with the given amount of titles. Titles are built from a skewed vocabulary and stop words,
+    episode names keep coming back and some titles have no genres (\\N).
+    """
+    generator = random.Random(seed)
+    vocabulary = _STOP_WORDS + words(5000, generator)
+    weights = zipf_weights(len(vocabulary))
+    recurring = [' '.join(generator.choices(vocabulary, weights, k=2)).title() for _ in range(200)]
+    with open(path, 'w', encoding='utf-8', newline='') as tsv_file:
+        tsv_file.write('tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\t'
+                       'runtimeMinutes\tgenres\n')
+        for number in range(titles):
+            title_type = generator.choices(_TITLE_TYPES, _TITLE_TYPE_WEIGHTS)[0]
+            if title_type == 'tvEpisode' and generator.random() < 0.5:
+                title = generator.choice(recurring)
+            else:
+                title = ' '.join(generator.choices(vocabulary, weights, k=generator.randint(1, 4))).title()
+            if generator.random() < 0.05:
+                genres = '\\N'
+            else:
+                genres = ','.join(sorted(set(generator.choices(_GENRES, _GENRE_WEIGHTS, k=generator.randint(1, 3)))))
+            tsv_file.write(f'tt{number:07}\t{title_type}\t{title}\t{title}\t0\t{generator.randint(1900, 2021)}\t\\N\t'
+                           f'{generator.randint(1, 200)}\t{genres}\n')
+    return titles
+
+
+def retail_csv(path, lines, seed=0):
+    """
+    Writes an online retail csv with the given amount of invoice lines. Some descriptions contain commas (so they are
+    quoted), some customers and a few stockcodes are blank and some quantities are negative (returns).
+    """
+    generator = random.Random(seed)
+    stockcodes = [f'{generator.randint(10000, 99999)}{generator.choice(["", "", "", "A", "B"])}' for _ in range(3000)]
+    descriptions = {}
+    for stockcode in stockcodes:
+        name = ' '.join(generator.choices(['SET', 'OF', '6', 'MUG', 'HANGING', 'HEART', 'LANTERN', 'BAG', 'CAKE',
+                                           'TIN', 'VINTAGE', 'CHRISTMAS', 'JUMBO', 'GLASS'], k=3))
+        if generator.random() < 0.2:
+            name += ', ' + generator.choice(_COLOURS)
+        descriptions[stockcode] = name
+    stockcode_weights = zipf_weights(len(stockcodes))
+    customers = [str(generator.randint(12000, 18999)) for _ in range(4000)]
+    customer_weights = zipf_weights(len(customers))
+    with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Invoice', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'Price', 'Customer ID',
+                         'Country'])
+        for number in range(lines):
+            stockcode = generator.choices(stockcodes, stockcode_weights)[0] if generator.random() > 0.001 else ''
+            quantity = generator.randint(1, 48) * (-1 if generator.random() < 0.02 else 1)
+            year = generator.choice((2009, 2010, 2011))
+            month = 12 if year == 2009 else generator.randint(1, 12)
+            date = f'{month}/{generator.randint(1, 28)}/{year} {generator.randint(7, 20):02}:' \
+                   f'{generator.randint(0, 59):02}:{generator.randint(0, 59):02}'
+            customer = generator.choices(customers, customer_weights)[0] if generator.random() > 0.2 else ''
+            writer.writerow([489434 + number // 20, stockcode, descriptions.get(stockcode, ''), quantity, date,
+                             round(generator.uniform(0.1, 20), 2), customer, generator.choice(_COUNTRIES)])
+    return lines
+
+
+def arxiv_json(path, jsonl_path, summary_path, papers, seed=0):
+    """
+    Writes the papers as a JSON array (like arxivData.json) and as JSON lines. Every paper is about a few topics, whose
+    words make up most of its summary, so some papers are clearly more similar than others. summary.txt is a changed
+    copy of one of the papers.
+    """
+    generator = random.Random(seed)
+    vocabulary = words(8000, generator) + ['network', 'networks', 'model', 'models', 'learning', 'cannot', 'the',
+                                           'and', 'we', 'this']
+    topics = [generator.sample(vocabulary, 60) for _ in range(100)]
+    source = None
+    with open(path, 'w', encoding='utf-8') as json_file, open(jsonl_path, 'w', encoding='utf-8') as jsonl_file:
+        json_file.write('[\n')
+        for number in range(papers):
+            paper_topics = generator.sample(topics, 2)
+            summary_words = [generator.choice(generator.choice(paper_topics)) if generator.random() < 0.7
+                             else generator.choice(vocabulary) for _ in range(generator.randint(40, 200))]
+            summary = ' '.join(summary_words)
+            if generator.random() < 0.3:  # The summaries contain escaped newlines
+                summary = summary.replace(' ', '\\n', 3)
+            paper = {'author': "[{'name': 'A. Author'}]", 'day': generator.randint(1, 28),
+                     'id': f'{1700 + number // 100000}.{number % 100000:05}v1', 'link': '[]',
+                     'month': generator.randint(1, 12), 'summary': summary, 'tag': '[]', 'title': f'Paper {number}',
+                     'year': 2017}
+            if number == papers // 2:
+                source = summary_words
+            json_file.write((',\n' if number else '') + json.dumps(paper))
+            jsonl_file.write(json.dumps(paper) + '\n')
+        json_file.write('\n]\n')
+    with open(summary_path, 'w', encoding='utf-8') as summary_file:
+        summary_file.write(' '.join(word for word in source if generator.random() < 0.8))
+    return papers
+
+
+def matrices(directory, size, seed=0):
+    """
+    Writes the dense matrices A (size x size + 1) and B (size + 1 x size) as text (like A.txt and B.txt) and as .npy,
+    and sparse ones with SPARSE_DENSITY of the elements as 'row,col,value' lines.
+    """
+    generator = np.random.RandomState(seed)
+    a, b = generator.rand(size, size + 1), generator.rand(size + 1, size)
+    np.savetxt(os.path.join(directory, 'A.txt'), a)
+    np.savetxt(os.path.join(directory, 'B.txt'), b)
+    np.save(os.path.join(directory, 'A.npy'), a)
+    np.save(os.path.join(directory, 'B.npy'), b)
+    for name, matrix in (('A_sparse.txt', a), ('B_sparse.txt', b)):
+        sparse = np.where(generator.rand(*matrix.shape) < SPARSE_DENSITY, matrix, 0)
+        # The last element is always written, so the shape of the matrix is known
+        sparse[-1, -1] = matrix[-1, -1]
+        rows, columns = np.nonzero(sparse)
+        with open(os.path.join(directory, name), 'w') as sparse_file:
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                sparse_file.write(f'{row},{column},{float(sparse[row, column])!r}\n')
+    return 2 * size * (size + 1)
+
+
+def generate(directory, scale, seed=0):
+    """
+    Generates all inputs at a scale into directory and writes manifest.json with the amount of records of every data
+    set, which run.py uses for the throughput.
+    """
+    os.makedirs(directory, exist_ok=True)
+    join = lambda name: os.path.join(directory, name)
+    records = {
+        'imdb': imdb_tsv(join('title.basics.tsv'), round(BASE_SIZES['imdb'] * scale), seed),
+        'retail': retail_csv(join('retail.csv'), round(BASE_SIZES['retail'] * scale), seed),
+        'arxiv': arxiv_json(join('arxivData.json'), join('arxivData.jsonl'), join('summary.txt'),
+                            round(BASE_SIZES['arxiv'] * scale), seed),
+        'matrix': matrices(directory, round(MATRIX_SIZE * math.sqrt(scale)), seed),
+    }
+    with open(join('manifest.json'), 'w', encoding='utf-8') as manifest_file:
+        json.dump({'version': VERSION, 'scale': scale, 'seed': seed, 'records': records}, manifest_file, indent=2)
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the synthetic inputs of the benchmarks')
+    parser.add_argument('directory', help='Directory to write the inputs to')
+    parser.add_argument('--scale', type=float, default=1, help='Size relative to the base size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generators')
+    arguments = parser.parse_args()
+    generate(arguments.directory, arguments.scale, arguments.seed)
@@ -0,0 +1,176 @@
+"""
+The expected results of the tasks, calculated with pandas and numpy instead of MapReduce, and the checks of the output
+of the jobs against them. Every check takes the lines written by a job and the data directory and returns None when the
+output is right, or a message which says what is wrong.
+
+The keywords of the IMDB titles and the words of the arXiv summaries come from the same helpers as the jobs
+(title_keywords.py and paper_text.py), so these checks are about the counting, summing and ranking of the jobs and not
+about nltk.
+"""
+import collections
+import csv
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(_ROOT, '1 IMDB'))
+sys.path.append(os.path.join(_ROOT, '3 Similar Paper Recommendations'))
+
+
+def _titles(directory):
+    """
+    The titles with their type and genres, split on whitespace like the jobs do: the primary title is the first word
+    after the type and the genres are the last field.
+    """
+    with open(os.path.join(directory, 'title.basics.tsv'), 'r', encoding='utf-8') as tsv_file:
+        rows = [line.split() for line in tsv_file]
+    return pd.DataFrame({'type': [row[1] for row in rows], 'title': [row[2] for row in rows],
+                         'genres': [row[-1] for row in rows]})
+
+
+def _with_keywords(titles):
+    # One row per keyword of every title, the keywords are found with the TitleKeywords of the jobs
+    from title_keywords import TitleKeywords
+    tagger = TitleKeywords(cache_size=1, batch_size=1000)
+    keywords = {}
+    for title in titles['title'].unique():
+        for tagged_title, title_keywords in tagger.add(title, title):
+            keywords[tagged_title] = title_keywords
+    keywords.update(tagger.flush())
+    return titles.assign(keyword=titles['title'].map(keywords)).explode('keyword').dropna(subset=['keyword'])
+
+
+def _top(frame, k, by=None):
+    # The k rows with the highest count (per group of by), ties are ordered on the word like the top_k of the jobs
+    frame = frame.sort_values(['count', 'keyword'], ascending=[False, True])
+    return frame.head(k) if by is None else frame.groupby(by, sort=False).head(k)
+
+
+def check_task_1(lines, directory, k=50):
+    titles = _titles(directory)
+    keywords = _with_keywords(titles[titles['type'].isin(['movie', 'short'])])
+    counts = keywords.groupby('keyword').size().rename('count').reset_index()
+    expected = {(row.keyword, row.count) for row in _top(counts, k).itertuples()}
+    found = set()
+    for line in lines:
+        word, count = line.rsplit(': ', 1)
+        found.add((word, int(count)))
+    if found != expected:
+        return f'{len(found - expected)} unexpected and {len(expected - found)} missing keywords'
+
+
+def check_task_2(lines, directory, k=15):
+    titles = _titles(directory)
+    movies = titles[titles['type'] == 'movie']
+    movies = movies.assign(genre=movies['genres'].str.split(',')).explode('genre')
+    keywords = _with_keywords(movies[movies['genre'] != '\\N'])
+    counts = keywords.groupby(['genre', 'keyword']).size().rename('count').reset_index()
+    expected = {(row.genre, row.keyword, row.count) for row in _top(counts, k, 'genre').itertuples()}
+    found = set()
+    for line in lines:
+        genre, word_count = line.split(': ', 1)
+        word, count = word_count.rsplit(', ', 1)
+        found.add((genre, word, int(count)))
+    if found != expected:
+        return f'{len(found - expected)} unexpected and {len(expected - found)} missing (genre, keyword) pairs'
+
+
+def _invoices(directory):
+    invoices = pd.read_csv(os.path.join(directory, 'retail.csv'), dtype={'StockCode': str, 'Customer ID': str},
+                           keep_default_na=False, quoting=csv.QUOTE_MINIMAL)
+    return invoices.assign(revenue=invoices['Quantity'] * invoices['Price'])
+
+
+def check_task_3(lines, directory, k=10):
+    invoices = _invoices(directory)
+    invoices = invoices[invoices['Customer ID'] != ''].rename(columns={'Customer ID': 'customer'})
+    years = pd.to_datetime(invoices['InvoiceDate'], format='%m/%d/%Y %H:%M:%S').dt.year.rename('year')
+    revenues = invoices.groupby([years, 'customer'])['revenue'].sum().reset_index()
+    revenues = revenues.sort_values(['revenue', 'customer'], ascending=[False, True]).groupby('year').head(k)
+    expected = {(int(row.year), row.customer): row.revenue for row in revenues.itertuples()}
+    found = {}
+    for line in lines:
+        match = re.match(r'Customer (\S+) spent €(\S+) in (\d+)', line)
+        if not match:
+            return f'unexpected line {line!r}'
+        customer, revenue, year = match.groups()
+        found[int(year), customer] = float(revenue)
+    if set(found) != set(expected):
+        return f'{len(set(found) - set(expected))} unexpected and {len(set(expected) - set(found))} missing customers'
+    wrong = [year_customer for year_customer, revenue in found.items()
+             if abs(revenue - expected[year_customer]) > 0.011]
+    if wrong:
+        return f'{len(wrong)} customers have a different revenue, e.g. {wrong[0]}'
+
+
+def check_task_4(lines, directory):
+    invoices = _invoices(directory)
+    sums = invoices[invoices['StockCode'] != ''].groupby('StockCode')[['Quantity', 'revenue']].sum()
+    quantity_match = re.match(r"Item '(.*)' was sold the most: (\S+) times", lines[0]) if lines else None
+    revenue_match = re.match(r"Item '(.*)' had the highest revenue", lines[1]) if len(lines) > 1 else None
+    if not quantity_match or not revenue_match:
+        return f'expected the most sold item and the item with the highest revenue, got {lines[:2]}'
+    quantity_item, revenue_item = quantity_match.group(1), revenue_match.group(1)
+    # Another item with the same quantity or revenue is fine as well
+    if sums['Quantity'].get(quantity_item) != sums['Quantity'].max():
+        return f'{quantity_item} was not sold the most, {sums["Quantity"].idxmax()} was'
+    if not np.isclose(sums['revenue'].get(revenue_item, np.nan), sums['revenue'].max()):
+        return f'{revenue_item} does not have the highest revenue, {sums["revenue"].idxmax()} has'
+
+
+def check_task_5(lines, directory):
+    import json
+    from paper_text import PaperWords
+    words = PaperWords()
+    with open(os.path.join(directory, 'summary.txt'), 'r', encoding='utf-8') as summary_file:
+        source = words.word_counts(summary_file.read())
+    with open(os.path.join(directory, 'arxivData.jsonl'), 'r', encoding='utf-8') as jsonl_file:
+        papers = [json.loads(line) for line in jsonl_file]
+    similarities = {}
+    source_norm = np.sqrt(sum(count * count for count in source.values()))
+    for paper in papers:
+        counts = words.word_counts(paper['summary'])
+        norm = np.sqrt(sum(count * count for count in counts.values()))
+        dot = sum(count * source[word] for word, count in counts.items() if word in source)
+        similarities[paper['id']] = dot / (norm * source_norm) if norm else 0.0
+    best = max(similarities.values())
+    match = re.match(r"Arxiv id '(.*)' has the most similar summary with a cosine similarity of (\S+)",
+                     lines[0]) if lines else None
+    if not match:
+        return f'expected the most similar paper, got {lines[:1]}'
+    paper_id, similarity = match.groups()
+    if not np.isclose(similarities.get(paper_id, np.nan), best) or abs(float(similarity) - best) > 0.0005:
+        return f"{paper_id} is not the most similar paper, {max(similarities, key=similarities.get)} is"
+
+
+def check_task_6(lines, directory, sparse=False):
+    if sparse:
+        a, b = (_sparse_matrix(os.path.join(directory, name)) for name in ('A_sparse.txt', 'B_sparse.txt'))
+    else:
+        a, b = np.load(os.path.join(directory, 'A.npy')), np.load(os.path.join(directory, 'B.npy'))
+    expected = a @ b
+    found = np.zeros_like(expected)
+    for line in lines:
+        row, column, value = line.split(',')
+        found[int(row), int(column)] = float(value)
+    error = np.linalg.norm(found - expected)
+    if error > 1e-9 * max(1.0, np.linalg.norm(expected)):
+        return f'the result differs from numpy by {error}'
+
+
+def _sparse_matrix(path):
+    entries = np.loadtxt(path, delimiter=',', ndmin=2)
+    rows, columns = entries[:, 0].astype(int), entries[:, 1].astype(int)
+    matrix = np.zeros((rows.max() + 1, columns.max() + 1))
+    matrix[rows, columns] = entries[:, 2]
+    return matrix
+
+
+CHECKS = collections.OrderedDict([
+    ('Task_1', check_task_1), ('Task_2', check_task_2), ('Task_3', check_task_3), ('Task_4', check_task_4),
+    ('Task_5', check_task_5), ('Task_6', check_task_6),
+    ('Task_6_sparse', lambda lines, directory: check_task_6(lines, directory, sparse=True)),
+])
@@ -0,0 +1,219 @@
+"""
+Benchmarks of the tasks on the synthetic data of generate.py. Every task is run with every runner at every scale, the
+wall time, throughput, peak memory (RSS) of the largest process and the bytes shuffled to the reducers are appended to
+the results file as JSON lines. The instrumentation of --profile (mrtools/instrumentation.py) makes the tasks slower, so
+the timed run isn't profiled and the shuffled bytes come from the summary of a second, profiled run. The output of every
+run is checked against references.py, a wrong result or a run which takes more than --tolerance longer than the last
+run of the --baseline results file makes the harness exit with 1.
+
+To run all tasks inline, on a local cluster and on the parallel executor of mrtools at 1, 10 and 100 times the base
+size (the inputs are generated in benchmarks\\data once):
+python benchmarks\\run.py
+
+To only benchmark Task_3 and Task_4 inline and compare them with an earlier run:
+python benchmarks\\run.py --tasks Task_3 Task_4 --runners inline --scales 1 10 --baseline benchmarks\\results.jsonl
+
+Task_6 on a local cluster reads the memory mapped .npy matrices, the text formats only work inline and on the
+parallel executor.
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from generate import VERSION, generate
+from references import CHECKS
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The script, input files, extra arguments and data set (for the amount of records) of every task. Where the inline
+# and local runners need different inputs, these are given per runner.
+TASKS = {
+    'Task_1': {'script': '1 IMDB/Task_1.py', 'inputs': ['title.basics.tsv'], 'records': 'imdb'},
+    'Task_2': {'script': '1 IMDB/Task_2.py', 'inputs': ['title.basics.tsv'], 'records': 'imdb'},
+    'Task_3': {'script': '2 Online Retail/Task_3.py', 'inputs': ['retail.csv'], 'records': 'retail'},
+    'Task_4': {'script': '2 Online Retail/Task_4.py', 'inputs': ['retail.csv'], 'records': 'retail'},
+    'Task_5': {'script': '3 Similar Paper Recommendations/Task_5.py', 'records': 'arxiv',
+               'args': ['--source_file={data}/summary.txt'],
+               'inputs': {'inline': ['arxivData.json'], 'local': ['arxivData.jsonl'], 'parallel': ['arxivData.json']},
+               'runner_args': {'local': ['--input_format=jsonl']}},
+    'Task_6': {'script': '4 Matrix Multiplication/Task_6.py', 'records': 'matrix', 'args': ['--block_size=20'],
+               'inputs': {'inline': ['A.txt', 'B.txt'], 'local': ['A.npy', 'B.npy'], 'parallel': ['A.txt', 'B.txt']},
+               'runner_args': {'local': ['--memmap']}},
+    'Task_6_sparse': {'script': '4 Matrix Multiplication/Task_6.py', 'records': 'matrix', 'args': ['--sparse'],
+                      'inputs': {'inline': ['A_sparse.txt', 'B_sparse.txt'],
+                                 'parallel': ['A_sparse.txt', 'B_sparse.txt']}},
+}
+
+
+def per_runner(value, runner):
+    # A setting which is either the same for every runner or a dictionary per runner (None when it can't run)
+    return value.get(runner) if isinstance(value, dict) else value
+
+
+# Runs a command and writes the peak RSS of the largest process it started to a file. The harness runs the command
+# through this small process, as a process started by the harness itself (which has imported pandas) would start out
+# with the memory of the harness as its peak RSS.
+_RUN_AND_MEASURE = """
+import resource, subprocess, sys
+exit_code = subprocess.call(sys.argv[2:])
+with open(sys.argv[1], 'w') as rss_file:
+    rss_file.write(str(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+sys.exit(exit_code)
+"""
+
+
+def run_process(command, stdout, stderr, work_dir):
+    """
+    Runs a command and returns its exit code and the peak RSS in bytes of the largest process it started. The resource
+    module isn't available on Windows, there the peak RSS is None.
+    """
+    if sys.platform == 'win32':
+        return subprocess.call(command, stdout=stdout, stderr=stderr), None
+    rss_path = os.path.join(work_dir, 'rss.txt')
+    exit_code = subprocess.call([sys.executable, '-c', _RUN_AND_MEASURE, rss_path] + command, stdout=stdout,
+                                stderr=stderr)
+    with open(rss_path, 'r') as rss_file:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return exit_code, int(rss_file.read()) * (1 if sys.platform == 'darwin' else 1024)
+
+
+def shuffle_bytes(command, work_dir):
+    # The bytes read by the reducers of all steps, from a run of the command with --profile (None when it fails)
+    profile_dir = os.path.join(work_dir, 'profile')
+    with open(os.devnull, 'wb') as devnull:
+        # command starts with the python executable and the script, --profile is put right after them
+        if subprocess.call(command[:2] + ['--profile', profile_dir] + command[2:], stdout=devnull, stderr=devnull):
+            return None
+    with open(os.path.join(profile_dir, 'summary.json'), 'r', encoding='utf-8') as summary_file:
+        return sum(step.get('shuffle bytes', 0) for step in json.load(summary_file)['steps'])
+
+
+def benchmark(task, runner, scale, data_dir, records, processes):
+    # Runs one task and returns its result, or None when the task can't run on this runner
+    spec = TASKS[task]
+    inputs = per_runner(spec['inputs'], runner)
+    if inputs is None:
+        return None
+    args = [arg.format(data=data_dir) for arg in spec.get('args', [])]
+    args += per_runner(spec.get('runner_args', {}), runner) or []
+    input_paths = [os.path.join(data_dir, name) for name in inputs]
+    with tempfile.TemporaryDirectory() as work_dir:
+        command = [sys.executable, os.path.join(_ROOT, spec['script'])]
+        if runner == 'parallel':  # The executor is used when no runner is given
+            command.append(f'--processes={processes}')
+        else:
+            command += ['-r', runner]
+        if runner == 'local':
+            command.append('--no-bootstrap-mrjob')
+        command += args + input_paths
+        output_path, log_path = os.path.join(work_dir, 'output.txt'), os.path.join(work_dir, 'log.txt')
+        with open(output_path, 'wb') as output_file, open(log_path, 'wb') as log_file:
+            start = time.perf_counter()
+            exit_code, peak_rss = run_process(command, output_file, log_file, work_dir)
+            seconds = time.perf_counter() - start
+        result = {'task': task, 'runner': runner, 'scale': scale, 'seconds': round(seconds, 3)}
+        if exit_code:
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as log_file:
+                return dict(result, correct=False, error=log_file.read()[-2000:])
+        with open(output_path, 'r', encoding='utf-8') as output_file:
+            lines = [line.rstrip('\r\n') for line in output_file]
+        try:
+            error = CHECKS[task](lines, data_dir)
+        except Exception as exception:  # Output the check can't make sense of, e.g. a line in another format
+            error = f'the output could not be checked: {exception!r}'
+        input_bytes = sum(os.path.getsize(path) for path in input_paths)
+        return dict(result, input_bytes=input_bytes, records=records[spec['records']],
+                    records_per_second=round(records[spec['records']] / seconds),
+                    megabytes_per_second=round(input_bytes / seconds / 1e6, 3),
+                    peak_rss_megabytes=None if peak_rss is None else round(peak_rss / 1e6, 1),
+                    shuffle_bytes=shuffle_bytes(command, work_dir), correct=error is None, error=error)
+
+
+def data_for(data_root, scale):
+    # The inputs at a scale, which are only generated when they aren't there yet or come from an older generate.py
+    data_dir = os.path.join(data_root, f'{scale:g}')
+    manifest_path = os.path.join(data_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    if manifest.get('version') != VERSION:
+        print(f'Generating the inputs at scale {scale:g} in {data_dir}', file=sys.stderr)
+        manifest = {'records': generate(data_dir, scale)}
+    return data_dir, manifest['records']
+
+
+def revision():
+    # The commit which is benchmarked, so results of different versions can be told apart
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    # The last result of every (task, runner, scale) in an earlier results file
+    baseline = {}
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as baseline_file:
+            for line in baseline_file:
+                result = json.loads(line)
+                if result.get('correct'):
+                    baseline[result['task'], result['runner'], result['scale']] = result
+    return baseline
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the tasks on synthetic data')
+    parser.add_argument('--tasks', nargs='+', choices=sorted(TASKS), default=sorted(TASKS), help='Tasks to run')
+    parser.add_argument('--runners', nargs='+', choices=('inline', 'local', 'parallel'),
+                        default=['inline', 'local', 'parallel'],
+                        help='mrjob runners to run the tasks with, parallel is the executor of mrtools')
+    parser.add_argument('--processes', type=int, default=max(os.cpu_count() or 1, 2),
+                        help='Amount of processes of the parallel executor')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10, 100],
+                        help='Sizes of the inputs relative to the base size of generate.py')
+    parser.add_argument('--data', default=os.path.join(_ROOT, 'benchmarks', 'data'),
+                        help='Directory with the generated inputs, per scale')
+    parser.add_argument('--results', default=os.path.join(_ROOT, 'benchmarks', 'results.jsonl'),
+                        help='File the results are appended to')
+    parser.add_argument('--baseline', help='Earlier results file to compare the times with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Fraction a run may be slower than the baseline before it counts as a regression')
+    options = parser.parse_args(args)
+
+    baseline = load_baseline(options.baseline)
+    commit, started = revision(), datetime.datetime.now().isoformat(timespec='seconds')
+    failed = False
+    for scale in options.scales:
+        data_dir, records = data_for(options.data, scale)
+        for task in options.tasks:
+            for runner in options.runners:
+                result = benchmark(task, runner, scale, data_dir, records, options.processes)
+                if result is None:
+                    continue
+                previous = baseline.get((task, runner, scale))
+                if previous:
+                    result['baseline_seconds'] = previous['seconds']
+                    result['regression'] = result['seconds'] > previous['seconds'] * (1 + options.tolerance)
+                result.update(revision=commit, started=started)
+                with open(options.results, 'a', encoding='utf-8') as results_file:
+                    results_file.write(json.dumps(result) + '\n')
+                failed |= not result['correct'] or result.get('regression', False)
+                status = 'ok' if result['correct'] else f'WRONG: {result["error"]}'
+                if result.get('regression'):
+                    status += f', slower than the baseline ({previous["seconds"]} s)'
+                print(f'{task:<14}{runner:<9}{scale:>6g}x {result["seconds"]:>9.2f} s  '
+                      f'{result.get("records_per_second", 0):>9} records/s  '
+                      f'{result.get("peak_rss_megabytes") or 0:>7} MB  '
+                      f'{result.get("shuffle_bytes") or 0:>12} shuffled bytes  {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Helpers which are shared by the MapReduce jobs of the different tasks.
+# The jobs add the repository root to sys.path to import this package and upload it along with the job script via DIRS.
@@ -0,0 +1,38 @@
+class InMapperCombiner:
+    """
+    Sums the values of each key in a dictionary inside the mapper, instead of writing every (key, value) pair and
+    letting a combiner read them back in. When the dictionary holds max_entries keys all sums are passed on and the
+    dictionary is emptied, so the memory used stays bounded. A max_entries of 0 disables the combining, every pair is
+    then passed on straight away.
+
+    Keys have to be hashable, so use tuples instead of lists.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.sums = {}
+
+    def add(self, key, value):
+        if not self.max_entries:
+            yield key, value
+            return
+        self.sums[key] = self.sums.get(key, 0) + value
+        if len(self.sums) >= self.max_entries:
+            yield from self.flush()
+
+    def flush(self):
+        # To be called from mapper_final, so the sums which were not passed on yet aren't lost
+        sums, self.sums = self.sums, {}
+        yield from sums.items()
+
+
+def add_in_mapper_combine_args(job):
+    # Command line arguments to switch between a combiner and in-mapper combining, call this from configure_args
+    job.add_passthru_arg('--in_mapper_combine', action='store_true',
+                         help='Sum the values in the mapper itself instead of using a combiner')
+    job.add_passthru_arg('--combine_limit', type=int, default=100000,
+                         help='Amount of keys the mapper sums before passing them on when using --in_mapper_combine')
+
+
+def in_mapper_combiner(options):
+    # The InMapperCombiner for the command line arguments of add_in_mapper_combine_args
+    return InMapperCombiner(options.combine_limit if options.in_mapper_combine else 0)
@@ -0,0 +1,33 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A dictionary which holds at most max_size items. When it is full the least recently used item is removed to make
+    place for a new one. The amount of hits and misses is kept, so the size of the cache can be tuned.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        if key in self.items:
+            self.hits += 1
+            self.items.move_to_end(key)  # The item has been used, so it is now the most recently used one
+            return self.items[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.max_size:
+            self.items.popitem(last=False)  # Remove the least recently used item
@@ -0,0 +1,697 @@
+"""
+Running the steps of a job on a pool of processes on one machine, with the shuffle in memory. The inline runner runs
+every task one after the other in a single process and the local runner starts a process per task which reads and
+writes all of its records from and to files. Here every process of the pool runs mappers, combiners and reducers
+through the run_mapper, run_combiner and run_reducer of its own instance of the job (so the protocols, SORT_VALUES and
+the instrumentation work like they always do), only the lines they read and write stay in memory:
+
+- a map task sorts its output lines on the encoded key (on the whole line with SORT_VALUES), runs the combiner on them
+  and puts them in a shared memory block, with a sample of the keys and where they are in the block
+- from these samples the launcher splits the keys into a range per reducer, the ranges follow each other and hold about
+  the same amount of bytes. A reducer merges the part of every block which is in its range.
+- the output of the reducers goes to shared memory as well and is read by the map tasks of the next step
+
+The blocks of all processes together are kept below half of --memory_budget, a run which doesn't fit anymore is
+spilled to a file in --spill_dir instead. A task which buffers more than its share of the other half writes what it has
+to files as well, for a map task these are sorted runs which the reducers merge just like the blocks.
+
+Every input file of a mapper_raw step is read by its own task, like on a local cluster. Task_6 keeps the dimensions of
+the matrices it reads in class attributes for the next step, which only works when its mapper_raw tasks run one after
+the other in the same process. Jobs like that set MAPPER_RAW_IN_LAUNCHER: their mapper_raw tasks then run in the
+launcher and the class attributes they changed are handed to every later task.
+
+When no runner is given (-r) and the machine has more than one core, the jobs run on this executor with a process per
+core, -r inline still runs them inline. As the reducers get ranges of keys, their output files put together are in the
+same order as the output of the inline and local runners. The tasks run in the working directory of the launcher, the
+FILES and DIRS of the job are not copied.
+"""
+import bisect
+import glob
+import heapq
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+from mrjob.cat import decompress
+from mrjob.parse import parse_mr_job_stderr
+from mrjob.step import MRStep
+from mrjob.util import to_lines
+
+GROUP = 'executor'
+# Under the logger of mrjob, so the messages show up where the runners of mrjob log to
+log = logging.getLogger('mrjob.executor')
+# A line in a list takes about this many bytes more than its length (the bytes object and the reference to it)
+_LINE_OVERHEAD = 41
+# Input files are split into parts of at least this size, smaller parts aren't worth starting a task for
+_MIN_SPLIT_SIZE = 1 << 16
+# About this many keys of every sorted run are sampled, to split the keys into ranges for the reducers
+_SAMPLES_PER_RUN = 128
+# A reducer merges at most this many runs at once, with more runs (and so open files) they are merged in passes
+_MERGE_FACTOR = 100
+# On Windows a shared memory block is gone as soon as no process has it open anymore, so the process which made it
+# keeps it open until the launcher is done with it
+_KEEP_BLOCKS_OPEN = sys.platform == 'win32'
+_MISSING = object()
+
+
+def _key(line):
+    # Hadoop streaming splits the key from the value on the first tab
+    return line.split(b'\t', 1)[0]
+
+
+class _Store:
+    """
+    Keeps the sorted runs of the map tasks and the output of the reduce tasks. A run is ('memory', name, size) for a
+    shared memory block and ('file', path, size) for a spilled file, in both cases every line ends with a newline.
+    """
+    def __init__(self, in_memory, memory_budget, task_budget, directory):
+        self.in_memory = in_memory  # A multiprocessing.Value with the bytes in shared memory of all processes
+        self.memory_budget = memory_budget
+        self.task_budget = task_budget
+        self.directory = directory
+        self.open_blocks = {}
+        self.counts = {}
+        self.created = []  # The runs made by the current task
+
+    def count(self, name, amount):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def save(self, lines):
+        # The lines go to shared memory while they fit in the budget, otherwise they are spilled to a file
+        data = b''.join(line + b'\n' for line in lines)
+        if not data:
+            return None
+        with self.in_memory.get_lock():
+            fits = self.in_memory.value + len(data) <= self.memory_budget
+            if fits:
+                self.in_memory.value += len(data)
+        if not fits:
+            path = self.new_path()
+            with open(path, 'wb') as run_file:
+                run_file.write(data)
+            return self.spilled(path)
+        block = shared_memory.SharedMemory(create=True, size=len(data))
+        block.buf[:len(data)] = data
+        if _KEEP_BLOCKS_OPEN:
+            self.open_blocks[block.name] = block
+        else:
+            block.close()
+        self.count('bytes in shared memory', len(data))
+        self.created.append(('memory', block.name, len(data)))
+        return self.created[-1]
+
+    def new_path(self):
+        descriptor, path = tempfile.mkstemp(suffix='.run', dir=self.directory)
+        os.close(descriptor)
+        return path
+
+    def spilled(self, path):
+        size = os.path.getsize(path)
+        self.count('bytes spilled', size)
+        self.count('spilled runs', 1)
+        self.created.append(('file', path, size))
+        return self.created[-1]
+
+    def lines(self, run, start=0, end=None):
+        # The lines of a run (or of the bytes [start, end) of it, which start and end at a line), without their newlines
+        kind, name, size = run
+        end = size if end is None else end
+        if kind == 'file':
+            with open(name, 'rb') as run_file:
+                run_file.seek(start)
+                position = start
+                for line in run_file:
+                    if position >= end:
+                        return
+                    position += len(line)
+                    yield line[:-1]
+            return
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(block.buf[start:end])
+        finally:
+            block.close()
+        yield from data.split(b'\n')[:-1]
+
+    def to_file(self, run):
+        # mapper_raw needs a path, a run in shared memory is written to a file first
+        if run[0] == 'file':
+            return run[1]
+        path = self.new_path()
+        with open(path, 'wb') as run_file:
+            run_file.writelines(line + b'\n' for line in self.lines(run))
+        return path
+
+    def free(self, run):
+        kind, name, size = run
+        if kind == 'file':
+            os.remove(name)
+            return
+        block = shared_memory.SharedMemory(name=name)
+        block.close()
+        block.unlink()
+        with self.in_memory.get_lock():
+            self.in_memory.value -= size
+
+    def discard(self):
+        # Frees the runs of a task which failed
+        for run in self.created:
+            self.release([run[1]])
+            self.free(run)
+        self.created = []
+
+    def release(self, names):
+        # Closes the blocks of this process which the launcher has freed (they are only kept open on Windows)
+        for name in names:
+            block = self.open_blocks.pop(name, None)
+            if block is not None:
+                block.close()
+
+
+class _RunWriter:
+    """
+    Collects the output lines of a task. They are kept in memory until they take more than the budget of a task, from
+    then on they are written to a file. The output of the last step is written to its part file right away.
+    """
+    def __init__(self, store, path=None):
+        self.store = store
+        self.path = path
+        self.lines = []
+        self.size = 0
+        self.file = None if path is None else open(path, 'wb')
+
+    def add(self, line):
+        if self.file is not None:
+            self.file.write(line + b'\n')
+            return
+        self.lines.append(line)
+        self.size += len(line) + _LINE_OVERHEAD
+        if self.size > self.store.task_budget:
+            self.file = open(self.store.new_path(), 'wb')
+            self.file.writelines(line + b'\n' for line in self.lines)
+            self.lines = []
+
+    def finish(self):
+        if self.file is None:
+            return self.store.save(self.lines)
+        self.file.close()
+        return None if self.path is not None else self.store.spilled(self.file.name)
+
+
+class _SortedRuns:
+    """
+    The output of a map task for a step with a reducer. When the buffered lines take more than the budget of a task
+    they are sorted, combined and spilled as a run, the reducers merge the parts of all runs which are in their range.
+    """
+    def __init__(self, tasks, step_num, combine):
+        self.tasks = tasks
+        self.step_num = step_num
+        self.combine = combine
+        self.lines = []
+        self.runs = []  # (run, samples) of every sorted run
+        self.size = 0
+
+    def add(self, line):
+        self.lines.append(line)
+        self.size += len(line) + _LINE_OVERHEAD
+        if self.size > self.tasks.store.task_budget:
+            self.flush(spill=True)
+
+    def flush(self, spill=False):
+        if self.lines:
+            sorted_run = self.tasks.sorted_run(self.step_num, self.lines, self.combine, spill)
+            if sorted_run is not None:
+                self.runs.append(sorted_run)
+        self.lines = []
+        self.size = 0
+
+    def finish(self):
+        self.flush()
+        return self.runs
+
+
+class _LineSink:
+    # Takes the place of the stdout of a task, every line the task writes is handed to add
+    def __init__(self, add):
+        self.add = add
+        self.partial = b''
+
+    def write(self, data):
+        if data == b'\n':  # mrjob writes every line and its newline separately
+            self.add(self.partial)
+            self.partial = b''
+            return
+        *lines, self.partial = (self.partial + data).split(b'\n')
+        for line in lines:
+            self.add(line)
+
+    def flush(self):
+        pass
+
+
+def _read_split(path, start, end):
+    """
+    The lines of a file which start in [start, end), a line which started before start belongs to the split before.
+    Compressed files can't be split, for them end is None.
+    """
+    with open(path, 'rb') as input_file:
+        if end is None:
+            yield from to_lines(decompress(input_file, path))
+            return
+        if start:
+            input_file.seek(start - 1)
+            input_file.readline()
+        position = input_file.tell()
+        while position < end:
+            line = input_file.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line
+
+
+def _key_ranges(sorted_runs, reducers):
+    """
+    Splits the keys into a range [low, high) per reducer, from the samples of the sorted runs. Every sample stands for
+    the bytes up to the next one, the ranges get about the same amount of bytes. The first range has no low and the
+    last one no high, they follow each other so the reducers together see the keys in the same order as one reducer.
+    """
+    samples = []
+    for run, run_samples in sorted_runs:
+        ends = [offset for _, offset in run_samples[1:]] + [run[2]]
+        samples.extend((key, end - offset) for (key, offset), end in zip(run_samples, ends))
+    samples.sort()
+    total = sum(size for _, size in samples)
+    boundaries, seen = [], 0
+    for key, size in samples:
+        if len(boundaries) == reducers - 1:
+            break
+        if seen >= total * (len(boundaries) + 1) / reducers and (not boundaries or key > boundaries[-1]):
+            boundaries.append(key)
+        seen += size
+    return list(zip([None] + boundaries, boundaries + [None]))
+
+
+def _pieces(sorted_runs, low, high):
+    """
+    The parts (run, start, end) of the sorted runs which can contain keys in [low, high): from the last sample before low
+    up to the first sample at or after high. The reducer skips the lines around them which aren't in its range.
+    """
+    pieces = []
+    for run, samples in sorted_runs:
+        keys = [key for key, _ in samples]
+        first = 0 if low is None else max(bisect.bisect_left(keys, low) - 1, 0)
+        last = len(keys) if high is None else bisect.bisect_left(keys, high)
+        end = samples[last][1] if last < len(samples) else run[2]
+        if samples[first][1] < end:
+            pieces.append((run, samples[first][1], end))
+    return pieces
+
+
+def _class_state(job_class):
+    # The plain values in the class attributes of the job and its base classes, e.g. the MRJob.matrix1 of Task_6
+    return {(index, name): value for index, cls in enumerate(job_class.__mro__) for name, value in vars(cls).items()
+            if not name.startswith('__') and not hasattr(value, '__get__')}
+
+
+class _Tasks:
+    # The job and the store of one process, which run the tasks the launcher hands out
+    def __init__(self, job_class, args, store):
+        self.job_class = job_class
+        self.args = args
+        self.job = job_class(args)
+        self.combiner_job = None
+        self.store = store
+        self.sort_key = None if self.job.sort_values() else _key
+        # Keys are compared in the order of the sorted runs: all lines of a key start with the key and a tab, so with
+        # SORT_VALUES these come in the order of key + tab, which differs from the order of the keys for bytes below tab
+        self.range_key = (lambda line: _key(line) + b'\t') if self.job.sort_values() else _key
+        self.stderr = None
+        # The tasks read the jobconf from the environment, like on a cluster
+        for name, value in self.job.jobconf().items():
+            if value is not None:
+                os.environ[name.replace('.', '_')] = str(value)
+
+    def begin(self, task_id, class_state, freed):
+        self.store.release(freed)
+        for index, name, value in class_state:
+            setattr(self.job_class.__mro__[index], name, value)
+        os.environ['mapreduce_task_id'] = task_id
+        self.stderr = io.BytesIO()
+        self.store.counts = {}
+        self.store.created = []
+
+    def end(self):
+        # The counters which the task wrote to its stderr, anything else is passed on
+        parsed = parse_mr_job_stderr(self.stderr.getvalue())
+        for line in parsed['other']:
+            sys.stderr.write(line)
+        counters = parsed['counters']
+        counters.setdefault(GROUP, {}).update(self.store.counts)
+        return counters
+
+    def run(self, job, run_task, step_num, lines, add, args=()):
+        job.options.args = list(args)  # Without input files the task reads its stdin
+        job.sandbox(stdin=lines, stdout=_LineSink(add), stderr=self.stderr)
+        run_task(step_num)
+
+    def map_task(self, task_id, step_num, source, class_state, freed, output_path):
+        self.begin(task_id, class_state, freed)
+        try:
+            output = self.map_output(step_num, source, output_path)
+        except BaseException:
+            self.store.discard()
+            raise
+        return output, self.end()
+
+    def map_output(self, step_num, source, output_path):
+        step = self.job.steps()[step_num]
+        if step.has_explicit_reducer:
+            output = _SortedRuns(self, step_num, step.has_explicit_combiner)
+        else:
+            output = _RunWriter(self.store, output_path)
+        kind = source[0]
+        if kind == 'raw':  # mapper_raw gets the path and uri of its file instead of lines
+            os.environ['mapreduce_map_input_file'] = source[2]
+            self.run(self.job, self.job.run_mapper, step_num, [], output.add, source[1:])
+        elif kind == 'split':
+            os.environ['mapreduce_map_input_file'] = source[1]
+            self.run(self.job, self.job.run_mapper, step_num, _read_split(*source[1:]), output.add)
+        else:
+            lines = self.store.lines(source[1]) if source[1] else []
+            self.run(self.job, self.job.run_mapper, step_num, lines, output.add)
+        return output.finish()
+
+    def sorted_run(self, step_num, lines, combine, spill):
+        """
+        Sorts the lines and runs the combiner on them, returns the run with its samples or None when nothing is left.
+        The combiner runs on its own instance of the job, as the mapper may still be running when the lines are spilled.
+        """
+        lines.sort(key=self.sort_key)
+        if combine:
+            if self.combiner_job is None:
+                self.combiner_job = self.job_class(self.args)
+            combined = []
+            self.run(self.combiner_job, self.combiner_job.run_combiner, step_num, lines, combined.append)
+            combined.sort(key=self.sort_key)
+            lines = combined
+        if not lines:
+            return None
+        if spill:
+            path = self.store.new_path()
+            with open(path, 'wb') as run_file:
+                run_file.writelines(line + b'\n' for line in lines)
+            run = self.store.spilled(path)
+        else:
+            run = self.store.save(lines)
+        return run, self.samples(lines)
+
+    def samples(self, lines):
+        # The range key and the offset in the run of about _SAMPLES_PER_RUN lines, the first line is always one of them
+        step = max(len(lines) // _SAMPLES_PER_RUN, 1)
+        offsets = list(itertools.accumulate(map(len, lines), initial=0))
+        return [(self.range_key(lines[number]), offsets[number] + number) for number in range(0, len(lines), step)]
+
+    def merge(self, pieces, low, high):
+        # The lines of the pieces in sorted order, only the ones with a key in [low, high)
+        merged = heapq.merge(*(self.store.lines(*piece) for piece in pieces), key=self.sort_key)
+        if low is not None:
+            merged = itertools.dropwhile(lambda line: self.range_key(line) < low, merged)
+        if high is not None:
+            merged = itertools.takewhile(lambda line: self.range_key(line) < high, merged)
+        return merged
+
+    def reduce_task(self, task_id, step_num, pieces, key_range, class_state, freed, output_path):
+        self.begin(task_id, class_state, freed)
+        try:
+            output = self.reduce_output(step_num, pieces, key_range, output_path)
+        except BaseException:
+            self.store.discard()
+            raise
+        return output, self.end()
+
+    def reduce_output(self, step_num, pieces, key_range, output_path):
+        # The sorted runs of all map tasks are merged, so the reducer gets all values of a key one after the other
+        low, high = key_range
+        merged_paths = []
+        while len(pieces) > _MERGE_FACTOR:
+            # The first pieces are merged into one, which stays in front so equal keys keep the order of the map tasks
+            path = self.store.new_path()
+            with open(path, 'wb') as run_file:
+                run_file.writelines(line + b'\n' for line in self.merge(pieces[:_MERGE_FACTOR], low, high))
+            merged_paths.append(path)
+            pieces = [(('file', path, os.path.getsize(path)), 0, None)] + pieces[_MERGE_FACTOR:]
+        output = _RunWriter(self.store, output_path)
+        self.run(self.job, self.job.run_reducer, step_num, self.merge(pieces, low, high), output.add)
+        for path in merged_paths:
+            os.remove(path)
+        return output.finish()
+
+
+_tasks = None
+
+
+def _start_worker(job_class, args, in_memory, memory_budget, task_budget, directory):
+    global _tasks
+    _tasks = _Tasks(job_class, args, _Store(in_memory, memory_budget, task_budget, directory))
+
+
+def _map_task(*args):
+    return _tasks.map_task(*args)
+
+
+def _reduce_task(*args):
+    return _tasks.reduce_task(*args)
+
+
+def _add_counters(total, counters):
+    for group, group_counters in counters.items():
+        total_group = total.setdefault(group, {})
+        for name, amount in group_counters.items():
+            total_group[name] = total_group.get(name, 0) + amount
+
+
+def _log_counters(step_num, counters):
+    lines = [f'Counters of step {step_num + 1}:']
+    for group, group_counters in sorted(counters.items()):
+        lines.append(f'\t{group}')
+        lines.extend(f'\t\t{name}={amount}' for name, amount in sorted(group_counters.items()))
+    log.info('\n'.join(lines))
+
+
+class ParallelRunner:
+    """
+    Runs a job on a pool of processes. It has the part of the interface of the runners of mrjob which the jobs use: run,
+    cat_output and counters, and it cleans up its blocks and files when used as a context manager.
+    """
+    def __init__(self, job, processes, memory_budget, spill_dir=None):
+        self.job = job
+        self.processes = processes
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.work_dir = None
+        self.output_dir = None
+        self.store = None
+        self.live_runs = []  # The runs which haven't been freed yet
+        self.freed = []  # The names of the freed blocks, for Windows
+        self.launcher_tasks = None
+        self.initial_state = {}
+        self.class_state = []  # The class attributes changed by the tasks in the launcher
+        self.step_counters = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.cleanup()
+
+    def input_paths(self):
+        paths = []
+        for path in self.job.options.args or ['-']:
+            if path == '-':
+                path = os.path.join(self.work_dir, 'stdin')
+                with open(path, 'wb') as stdin_file:
+                    shutil.copyfileobj(self.job.stdin, stdin_file)
+            paths.append(path)
+        return paths
+
+    def input_splits(self, paths):
+        # The files are split into parts of the same size, so every process gets a few map tasks
+        split_size = max(sum(os.path.getsize(path) for path in paths) // (2 * self.processes) + 1, _MIN_SPLIT_SIZE)
+        for path in paths:
+            if path.endswith(('.gz', '.bz2')):
+                yield 'split', path, 0, None
+                continue
+            size = os.path.getsize(path)
+            for start in range(0, max(size, 1), split_size):
+                yield 'split', path, start, min(start + split_size, size)
+
+    def free(self, runs):
+        for run in runs:
+            self.store.free(run)
+            self.live_runs.remove(run)
+            if _KEEP_BLOCKS_OPEN and run[0] == 'memory':
+                self.freed.append(run[1])
+
+    def output_path(self, task_num):
+        return os.path.join(self.output_dir, f'part-{task_num:05}')
+
+    def track(self, output):
+        # The runs in the output of a task (a run, or the sorted runs of a map task) which have to be freed later on
+        if isinstance(output, list):
+            self.live_runs.extend(run for run, _ in output)
+        elif output is not None:
+            self.live_runs.append(output)
+
+    def run_on_pool(self, pool, function, task_args):
+        """
+        Runs tasks on the pool and returns their output and counters. The output of every task which finished is
+        tracked before the error of a failed task is raised, so its blocks are freed as well.
+        """
+        pending = [pool.apply_async(function, args) for args in task_args]
+        results, error = [], None
+        for result in pending:
+            try:
+                results.append(result.get())
+            except Exception as exception:
+                error = error or exception
+        for output, _ in results:
+            self.track(output)
+        if error is not None:
+            raise error
+        return results
+
+    def run_in_launcher(self, task_args):
+        # The mapper_raw tasks of a job with MAPPER_RAW_IN_LAUNCHER, the class attributes they change are passed on
+        if self.launcher_tasks is None:
+            self.launcher_tasks = _Tasks(type(self.job), self.job.launch_args, self.store)
+        results = []
+        try:
+            for args in task_args:
+                results.append(self.launcher_tasks.map_task(*args))
+        finally:
+            for output, _ in results:
+                self.track(output)
+        self.class_state = [(index, name, value) for (index, name), value in _class_state(type(self.job)).items()
+                            if self.initial_state.get((index, name), _MISSING) is not value]
+        return results
+
+    def map_sources(self, step_num, step, inputs, previous):
+        # What every map task of a step reads: a file for mapper_raw, a split of an input file or a run of the step before
+        if step['mapper_raw']:
+            paths = inputs if step_num == 0 else [self.store.to_file(run) for run in previous]
+            return [('raw', path, path) for path in paths]
+        if step_num == 0:
+            return list(self.input_splits(inputs))
+        return [('run', run) for run in previous] or [('run', None)]  # mapper_init and mapper_final still run once
+
+    def run_step(self, pool, step_num, num_steps, inputs, previous):
+        # Runs the map tasks and, when the step has a reducer, the reduce tasks of a step and returns its output runs
+        log.info(f'Running step {step_num + 1} of {num_steps} on {self.processes} processes')
+        step = self.job.steps()[step_num]
+        last = step_num == num_steps - 1
+        map_only = not step.has_explicit_reducer
+        map_args = [(f'map_{step_num}_{task_num}', step_num, source, self.class_state, tuple(self.freed),
+                     self.output_path(task_num) if last and map_only else None)
+                    for task_num, source in enumerate(self.map_sources(step_num, step, inputs, previous))]
+        if step['mapper_raw'] and self.job.MAPPER_RAW_IN_LAUNCHER:
+            results = self.run_in_launcher(map_args)
+        else:
+            results = self.run_on_pool(pool, _map_task, map_args)
+        counters = {GROUP: {'map tasks': len(results)}}
+        for _, task_counters in results:
+            _add_counters(counters, task_counters)
+        self.free(previous)  # The map tasks have read the output of the step before
+        outputs = [output for output, _ in results]
+
+        if not map_only:
+            sorted_runs = [sorted_run for output in outputs for sorted_run in output]
+            reduce_args = [(f'reduce_{step_num}_{task_num}', step_num, _pieces(sorted_runs, *key_range), key_range,
+                            self.class_state, tuple(self.freed), self.output_path(task_num) if last else None)
+                           for task_num, key_range in enumerate(_key_ranges(sorted_runs, self.processes))]
+            results = self.run_on_pool(pool, _reduce_task, reduce_args)
+            counters[GROUP]['reduce tasks'] = len(results)
+            for _, task_counters in results:
+                _add_counters(counters, task_counters)
+            self.free([run for run, _ in sorted_runs])
+            outputs = [output for output, _ in results]
+        self.step_counters.append(counters)
+        _log_counters(step_num, counters)
+        return [run for run in outputs if run]
+
+    def run(self):
+        job = self.job
+        steps = job.steps()
+        for step_num, step in enumerate(steps):
+            if not isinstance(step, MRStep):
+                raise TypeError(f'Step {step_num + 1} is not an MRStep, only these can run on the executor')
+        self.work_dir = tempfile.mkdtemp(prefix='executor-', dir=self.spill_dir)
+        self.output_dir = job.options.output_dir or os.path.join(self.work_dir, 'output')
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Half of the budget is for the blocks in shared memory, the other half is shared by the tasks
+        settings = (type(job), job.launch_args, multiprocessing.Value('q', 0), self.memory_budget // 2,
+                    self.memory_budget // 2 // self.processes, self.work_dir)
+        self.store = _Store(*settings[2:6])
+        self.initial_state = _class_state(type(job))
+        inputs = self.input_paths()
+        previous = []
+        if sys.platform != 'win32':  # The workers share the resource tracker of the launcher, which unlinks their blocks
+            resource_tracker.ensure_running()
+        with multiprocessing.Pool(self.processes, _start_worker, settings) as pool:
+            for step_num in range(len(steps)):
+                previous = self.run_step(pool, step_num, len(steps), inputs, previous)
+
+    def cat_output(self):
+        for path in sorted(glob.glob(os.path.join(self.output_dir, 'part-*'))):
+            with open(path, 'rb') as output_file:
+                yield from output_file
+
+    def counters(self):
+        # A dictionary of counters per step, like the runners of mrjob
+        return self.step_counters
+
+    def cleanup(self):
+        if self.store is not None:
+            self.free(list(self.live_runs))
+        if self.launcher_tasks is not None:
+            self.launcher_tasks.store.release(list(self.launcher_tasks.store.open_blocks))
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class ParallelJob:
+    """
+    Mixin for the jobs which runs them on the executor when no runner is given. It goes after InstrumentedJob, so
+    --profile also works on the executor: class CommonKeywords(InstrumentedJob, ParallelJob, MRJob).
+    """
+    # Set by jobs whose mapper_raw tasks pass on class attributes to the next step, see the top of this module
+    MAPPER_RAW_IN_LAUNCHER = False
+
+    def __init__(self, args=None):
+        super(ParallelJob, self).__init__(args)
+        # The processes of the pool make their own instance of the job with the same arguments
+        self.launch_args = list(sys.argv[1:] if args is None else args)
+
+    def configure_args(self):
+        super(ParallelJob, self).configure_args()
+        # These are only used when launching the job
+        self.arg_parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                                     help='Amount of processes to run the tasks on when no runner (-r) is given, '
+                                          'by default one per core, with 1 the job runs inline')
+        self.arg_parser.add_argument('--memory_budget', type=float, default=512,
+                                     help='Megabytes of pairs which are kept in memory by the processes, the rest is '
+                                          'spilled to disk')
+        self.arg_parser.add_argument('--spill_dir',
+                                     help='Directory for the pairs which are spilled, by default the temporary '
+                                          'directory')
+
+    def make_runner(self):
+        if self.options.runner is None and self.options.processes > 1:
+            return ParallelRunner(self, self.options.processes, int(self.options.memory_budget * 2 ** 20),
+                                  self.options.spill_dir)
+        return super(ParallelJob, self).make_runner()
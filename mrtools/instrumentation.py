@@ -0,0 +1,262 @@
+"""
+Instrumentation of the jobs. With --profile DIR every mapper, combiner and reducer task reports counters in the
+'instrumentation' group:
+the records and bytes it read and wrote and the milliseconds spent in every phase (e.g. mapper_init, mapper,
+mapper_final, reading and decoding the input and encoding the output). The bytes read by the reducers are what was
+shuffled, and the records written by the combiners divided by the records they read is how much the combiner saves.
+
+The counters are shown at the end of the run and written to DIR/summary.json per step, with the combiner ratios and the
+shuffled bytes worked out. With --cprofile as well, every map task runs under cProfile and the dump of the slowest map
+task of each step is kept as DIR/step-<n>-mapper.prof, e.g. for python -m pstats. Without --profile the tasks run
+exactly like they do with MRJob, as timing and counting every record makes the jobs a lot slower.
+"""
+import cProfile
+import collections
+import glob
+import itertools
+import json
+import os
+import pstats
+import time
+from mrjob.compat import jobconf_from_env
+
+GROUP = 'instrumentation'
+# The launcher tells the tasks to measure (and where to put the cProfile dumps) through jobconf variables, which the
+# runners turn into environment variables. Passthru arguments reach the tasks as they were typed, so a relative path
+# would point into the working directory of the task instead.
+_PROFILE = 'mrtools.profile'
+_PROFILE_DIR = 'mrtools.profile.dir'
+
+
+def profiling():
+    # Whether the job was started with --profile, for the jobs which report counters of their own
+    return bool(jobconf_from_env(_PROFILE))
+
+
+class TaskStats:
+    # The counts and times of one task, which are reported as counters once the task is done
+    def __init__(self, task_type):
+        self.task_type = task_type
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+
+    def timed(self, phase, function, *args):
+        """
+        Calls function and yields from the iterable it returns (if any). Only the time spent in the function and in
+        the iterable is added to phase, not the time spent by the code which consumes the pairs.
+        """
+        seconds = self.seconds
+        start = time.perf_counter()
+        iterator = iter(function(*args) or ())
+        seconds[phase] += time.perf_counter() - start
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds[phase] += time.perf_counter() - start
+            yield item
+
+    def report(self, job):
+        for name, count in self.counts.items():
+            job.increment_counter(GROUP, f'{self.task_type} {name}', count)
+        for phase, seconds in self.seconds.items():
+            job.increment_counter(GROUP, f'{phase} ms', round(seconds * 1000))
+        job.increment_counter(GROUP, f'{self.task_type} tasks', 1)
+
+
+def step_summary(counters):
+    # The instrumentation counters of one step, grouped per task type
+    summary = {}
+    for name, value in counters.get(GROUP, {}).items():
+        task_type = name.split(' ', 1)[0].split('_')[0]
+        summary.setdefault(task_type, {})[name] = value
+    combiner = summary.get('combiner', {})
+    if combiner.get('combiner records in'):
+        combiner['combiner ratio'] = combiner.get('combiner records out', 0) / combiner['combiner records in']
+    if 'reducer' in summary:
+        summary['shuffle bytes'] = summary['reducer'].get('reducer bytes in', 0)
+    return summary
+
+
+def keep_hottest_mappers(directory):
+    # Of the cProfile dumps of every map task only the one with the most time per step is kept
+    dumps = {}
+    for path in glob.glob(os.path.join(directory, 'step-*-mapper-*.prof')):
+        step = os.path.basename(path).split('-')[1]
+        dumps.setdefault(step, []).append((pstats.Stats(path).total_tt, path))
+    hottest = {}
+    for step, step_dumps in dumps.items():
+        seconds, path = max(step_dumps)
+        hottest[step] = os.path.join(directory, f'step-{step}-mapper.prof')
+        os.replace(path, hottest[step])
+        for _, other_path in step_dumps:
+            if other_path != path:
+                os.remove(other_path)
+    return hottest
+
+
+def write_summary(directory, counters, seconds, hottest):
+    summary = {
+        'seconds': seconds,
+        'steps': [dict(step_summary(step_counters), step=step_num) for step_num, step_counters in
+                  enumerate(counters, 1)],
+        'hottest mappers': hottest,
+        'counters': counters,
+    }
+    with open(os.path.join(directory, 'summary.json'), 'w', encoding='utf-8') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+
+class InstrumentedJob:
+    """
+    Mixin for the jobs, it goes before MRJob: class CommonKeywords(InstrumentedJob, MRJob). With --profile the tasks
+    run the same way as with MRJob, map_pairs, combine_pairs and reduce_pairs only time every phase and the protocols
+    count the records and bytes. Without --profile, or when these are called without run_mapper, run_combiner or
+    run_reducer (e.g. in a test), nothing is measured.
+    """
+    _task_stats = None
+
+    def configure_args(self):
+        super(InstrumentedJob, self).configure_args()
+        # These are only used when launching the job, the tasks get the directory for cProfile through the jobconf
+        self.arg_parser.add_argument('--profile', metavar='DIR',
+                                     help='Write a JSON summary of the instrumentation counters of every step to DIR')
+        self.arg_parser.add_argument('--cprofile', action='store_true',
+                                     help='With --profile, also keep a cProfile dump of the slowest map task per step')
+
+    def jobconf(self):
+        jobconf = super(InstrumentedJob, self).jobconf()
+        if self.options.profile:
+            jobconf = dict(jobconf)
+            jobconf[_PROFILE] = 'true'
+            if self.options.cprofile:
+                jobconf[_PROFILE_DIR] = os.path.abspath(self.options.profile)
+        return jobconf
+
+    def make_runner(self):
+        # Every job which launches itself uses make_runner, also the ones with their own run_job
+        runner = super(InstrumentedJob, self).make_runner()
+        if self.options.profile:
+            run = runner.run
+
+            def run_and_summarize():
+                os.makedirs(self.options.profile, exist_ok=True)
+                for path in glob.glob(os.path.join(self.options.profile, 'step-*-mapper*.prof')):
+                    os.remove(path)  # Dumps of an earlier run
+                start = time.perf_counter()
+                run()
+                write_summary(self.options.profile, runner.counters(), time.perf_counter() - start,
+                              keep_hottest_mappers(self.options.profile))
+            runner.run = run_and_summarize
+        return runner
+
+    def run_mapper(self, step_num=0):
+        if not profiling():
+            super(InstrumentedJob, self).run_mapper(step_num)
+            return
+        profile_dir = jobconf_from_env(_PROFILE_DIR)
+        if not profile_dir:
+            self.run_instrumented('mapper', super(InstrumentedJob, self).run_mapper, step_num)
+            return
+        profiler = cProfile.Profile()
+        profiler.runcall(self.run_instrumented, 'mapper', super(InstrumentedJob, self).run_mapper, step_num)
+        task = jobconf_from_env('mapreduce.task.id') or str(os.getpid())
+        profiler.dump_stats(os.path.join(profile_dir, f'step-{step_num + 1}-mapper-{task}.prof'))
+
+    def run_combiner(self, step_num=0):
+        if not profiling():
+            super(InstrumentedJob, self).run_combiner(step_num)
+            return
+        self.run_instrumented('combiner', super(InstrumentedJob, self).run_combiner, step_num)
+
+    def run_reducer(self, step_num=0):
+        if not profiling():
+            super(InstrumentedJob, self).run_reducer(step_num)
+            return
+        self.run_instrumented('reducer', super(InstrumentedJob, self).run_reducer, step_num)
+
+    def run_instrumented(self, task_type, run, step_num):
+        self._task_stats = stats = TaskStats(task_type)
+        try:
+            start = time.perf_counter()
+            run(step_num)
+            stats.seconds[task_type + ' total'] += time.perf_counter() - start
+        finally:
+            self._task_stats = None
+        stats.report(self)
+
+    def pick_protocols(self, step_num, step_type):
+        # The protocols are wrapped to count the records and bytes which are read and written
+        read, write = super(InstrumentedJob, self).pick_protocols(step_num, step_type)
+        stats = self._task_stats
+        if stats is None:
+            return read, write
+
+        def counted_read(line):
+            stats.counts['records in'] += 1
+            stats.counts['bytes in'] += len(line) + 1  # With the newline
+            return read(line)
+
+        def counted_write(key, value):
+            start = time.perf_counter()
+            line = write(key, value)
+            stats.seconds[step_type + ' output'] += time.perf_counter() - start
+            stats.counts['records out'] += 1
+            stats.counts['bytes out'] += len(line) + 1
+            return line
+        return counted_read, counted_write
+
+    def map_pairs(self, pairs, step_num=0):
+        # Not a generator itself, so without measuring the pairs come straight from MRJob.map_pairs
+        if self._task_stats is None:
+            return super(InstrumentedJob, self).map_pairs(pairs, step_num)
+        return self.map_pairs_timed(pairs, step_num)
+
+    def map_pairs_timed(self, pairs, step_num):
+        # The same as MRJob.map_pairs, with every phase timed
+        stats = self._task_stats
+        step = self.steps()[step_num]
+        if step['mapper_init']:
+            yield from stats.timed('mapper_init', step['mapper_init'])
+        if step['mapper_raw']:
+            if len(self.options.args) != 2:
+                raise ValueError('Wrong number of args')
+            input_path, input_uri = self.options.args
+            yield from stats.timed('mapper_raw', step['mapper_raw'], input_path, input_uri)
+        else:
+            mapper = step['mapper']
+            for key, value in stats.timed('mapper input', iter, pairs):
+                yield from stats.timed('mapper', mapper, key, value)
+        if step['mapper_final']:
+            yield from stats.timed('mapper_final', step['mapper_final'])
+
+    def combine_pairs(self, pairs, step_num=0):
+        if self._task_stats is None:
+            return super(InstrumentedJob, self).combine_pairs(pairs, step_num)
+        return self.combine_or_reduce_timed(pairs, 'combiner', step_num)
+
+    def reduce_pairs(self, pairs, step_num=0):
+        if self._task_stats is None:
+            return super(InstrumentedJob, self).reduce_pairs(pairs, step_num)
+        return self.combine_or_reduce_timed(pairs, 'reducer', step_num)
+
+    def combine_or_reduce_timed(self, pairs, task_type, step_num):
+        # The same as MRJob.combine_pairs and reduce_pairs, with every phase timed
+        stats = self._task_stats
+        step = self.steps()[step_num]
+        task = step[task_type]
+        if task is None:
+            raise ValueError(f'No {task_type} in step {step_num}')
+        if step[task_type + '_init']:
+            yield from stats.timed(task_type + '_init', step[task_type + '_init'])
+        input_phase = task_type + ' input'
+        for key, pairs_for_key in itertools.groupby(stats.timed(input_phase, iter, pairs), lambda pair: pair[0]):
+            # The task reads its values from the input, that time is already counted for the input
+            input_seconds = stats.seconds[input_phase]
+            yield from stats.timed(task_type, task, key, (value for _, value in pairs_for_key))
+            stats.seconds[task_type] -= stats.seconds[input_phase] - input_seconds
+        if step[task_type + '_final']:
+            yield from stats.timed(task_type + '_final', step[task_type + '_final'])
@@ -0,0 +1,58 @@
+"""
+Spreading hot keys over multiple reducers. When (almost) all pairs of a step have the same key, like the None key of
+the overall rankings or a large genre like Drama, one reducer does all the work. With salting such a key is split into
+partitions: the key becomes (key, partition), every reducer selects the top values of its partition and an extra step
+merges the partial results per key with the same reducer. This works for top-k and max reducers, as the top values of
+all values are always among the top values of the partitions.
+
+Which keys are hot can be seen from the KeySizes counters of the step before.
+"""
+import collections
+import zlib
+
+
+class KeySalter:
+    """
+    Turns a key into (key, partition). The partition is taken from a hash of the item (e.g. the word), so the same
+    item always ends up in the same partition. When hot_keys is given only these keys are split, the other keys get
+    partition 0. Keys are compared as strings, the names of the KeySizes counters, so --hot_keys=None matches None.
+    """
+    def __init__(self, partitions, hot_keys=None):
+        self.partitions = partitions
+        self.hot_keys = None if hot_keys is None else frozenset(hot_keys)
+
+    def salt(self, key, item):
+        if self.hot_keys is not None and str(key) not in self.hot_keys:
+            return key, 0
+        return key, zlib.crc32(str(item).encode('utf-8')) % self.partitions
+
+
+def unsalt(salted_key, value):
+    # The mapper of the merge step, which brings the partial results of all partitions of a key together again
+    yield salted_key[0], value
+
+
+class KeySizes:
+    # Counts the pairs which go to each key of the next step, call report from reducer_final
+    def __init__(self):
+        self.sizes = collections.Counter()
+
+    def add(self, key):
+        self.sizes[key] += 1
+
+    def report(self, job, group='key sizes of the next step'):
+        for key, size in self.sizes.items():
+            job.increment_counter(group, str(key), size)
+
+
+def add_salting_args(job):
+    # Command line arguments to salt the hot keys, call this from configure_args
+    job.add_passthru_arg('--salt_partitions', type=int, default=0,
+                         help='Split hot keys over this amount of reducers and merge the results in an extra step')
+    job.add_passthru_arg('--hot_keys',
+                         help='Comma separated keys to split when using --salt_partitions, by default all keys')
+
+
+def key_salter(options):
+    # The KeySalter for the command line arguments of add_salting_args
+    return KeySalter(options.salt_partitions, options.hot_keys.split(',') if options.hot_keys else None)
@@ -0,0 +1,108 @@
+"""
+The word lists which the text processing of the IMDB and arXiv jobs needs, precompiled into one file. Building the stop
+words from five nltk corpora, importing scikit-learn for its english stop words and warming up WordNet for every
+lemma takes longer than the actual work of a small map task, while loading the pickled tables takes milliseconds.
+
+To build the tables, with the lemmas of all words in the arXiv summaries:
+python mrtools/text_tables.py text_tables.pickle "3 Similar Paper Recommendations/arxivData.json"
+
+The jobs take the file with --text_tables and load it in their init hooks. Without it the tables are built from nltk
+and scikit-learn in every task, like before.
+"""
+import argparse
+import functools
+import pickle
+import re
+
+# VBZ = auxiliary verbs, IN = preposition, DT = articles/determinants, CC = conjunction, CNJ = conjunction,
+# PRO = pronoun, POS = possessive ending ('s), P = preposition, the others are the respective symbols.
+NON_USEFUL_TYPES = frozenset(('VBZ', 'IN', 'DT', 'CC', 'CNJ', 'PRO', 'P', 'POS', ',', ':', '.', '\''))
+
+# The only words consisting of letters which nltk's word_tokenize splits up, see the contractions of its tokenizer
+_CONTRACTION_CANDIDATES = ('cannot', 'gimme', 'gonna', 'gotta', 'lemme', 'wanna', 'whaddya', 'whatcha')
+
+
+def title_stop_words():
+    # We'll generate a set with words to avoid: common stopwords in the most common languages
+    from nltk.corpus import stopwords
+    stop_words = {re.sub("'", "\'", word) for language in ('english', 'spanish', 'french', 'german', 'italian')
+                  for word in stopwords.words(language)}
+    # We'll also ignore the word 'untitled'
+    stop_words.add('untitled')
+    return frozenset(stop_words)
+
+
+def english_stop_words():
+    # The stop words of scikit-learn's CountVectorizer(stop_words='english')
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return frozenset(ENGLISH_STOP_WORDS)
+
+
+def contractions():
+    # The words which word_tokenize splits into multiple tokens, e.g. 'cannot' -> ('can', 'not')
+    import nltk
+    tokens = {word: tuple(nltk.tokenize.word_tokenize(word)) for word in _CONTRACTION_CANDIDATES}
+    return {word: word_tokens for word, word_tokens in tokens.items() if word_tokens != (word,)}
+
+
+@functools.lru_cache(maxsize=None)
+def lemmatizer():
+    # Creating the lemmatizer (and loading WordNet on its first use) is slow, so there is only one
+    import nltk
+    return nltk.stem.wordnet.WordNetLemmatizer()
+
+
+def vocabulary(paths):
+    """
+    The lowercase words in some files. Escaped newlines ('\\n') are taken out first, so they don't stick an 'n' in front
+    of the next word.
+    """
+    words = set()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as text_file:
+            for line in text_file:
+                words.update(re.findall('[a-z]+', line.replace('\\n', ' ').lower()))
+    return words
+
+
+def build_tables(vocabulary_paths=()):
+    # Everything nltk and scikit-learn are needed for, the lemmas are looked up for the words in vocabulary_paths
+    words = vocabulary(vocabulary_paths)
+    word_contractions = contractions()
+    # The tokens of the contractions (e.g. 'not' of 'cannot') are lemmatized too
+    words.update(token for tokens in word_contractions.values() for token in tokens)
+    return {
+        'title_stop_words': title_stop_words(),
+        'non_useful_types': NON_USEFUL_TYPES,
+        'english_stop_words': english_stop_words(),
+        'contractions': word_contractions,
+        'lemmas': {word: lemmatizer().lemmatize(word) for word in sorted(words)},
+    }
+
+
+def save_tables(path, tables):
+    with open(path, 'wb') as tables_file:
+        pickle.dump(tables, tables_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_tables(path):
+    with open(path, 'rb') as tables_file:
+        return pickle.load(tables_file)
+
+
+def add_text_tables_arg(job):
+    # Command line argument to use precompiled tables, call this from configure_args. The file is uploaded with the job
+    job.add_file_arg('--text_tables', help='File made by mrtools/text_tables.py, which loads faster than nltk')
+
+
+def text_tables(options):
+    # The tables given with --text_tables, or None to build them from nltk and scikit-learn
+    return load_tables(options.text_tables) if options.text_tables else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the text tables of the IMDB and arXiv jobs')
+    parser.add_argument('output', help='File to save the tables to')
+    parser.add_argument('vocabulary', nargs='*', help='Files of which the words are lemmatized')
+    arguments = parser.parse_args()
+    save_tables(arguments.output, build_tables(arguments.vocabulary))
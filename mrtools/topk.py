@@ -0,0 +1,34 @@
+import heapq
+
+
+class _Reversed:
+    # Wraps a value so that it compares the other way around, e.g. to prefer the alphabetically smallest word
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def top_k(values, k, score=0, tie=1):
+    """
+    Returns the k values with the highest value[score], from highest to lowest. Only k values are kept in a heap at any
+    time, so this takes O(k) memory and O(n log k) time instead of sorting all n values. Values with the same score are
+    ordered on value[tie] (smallest first), so the result does not depend on the order in which the values arrive.
+    """
+    if k <= 0:
+        return []
+    heap = []
+    for index, value in enumerate(values):
+        # The index makes sure the values themselves never have to be compared
+        item = (value[score], _Reversed(value[tie]), -index, value)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif heap[0] < item:
+            heapq.heapreplace(heap, item)
+    return [item[-1] for item in sorted(heap, reverse=True)]